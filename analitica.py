@@ -0,0 +1,175 @@
+"""Tendencias de mantenimiento: backlog, MTTR, fallas por activo y carga por técnico.
+
+Los cálculos parten de tres resúmenes que mantiene la base por trigger
+(sql/06_analitica.sql): por semana y categoría, por semana y técnico, y por
+activo. Así el tablero lee unas pocas filas por semana en vez del histórico de
+órdenes. Si la base aún no los tiene, rollups_desde_ordenes() arma los mismos
+resúmenes en memoria. Todo se calcula con operaciones vectorizadas de pandas.
+
+La semana es la del lunes en que empieza (UTC), igual que date_trunc('week').
+Las concluidas sin fecha de cierre (anteriores a sql/06) cuentan como cerradas
+en su semana de creación, pero no entran en el MTTR: `reparaciones` son solo
+las cerradas con fecha.
+"""
+import pandas as pd
+
+TAM_PAGINA = 1000
+# Semanas que promedia el MTTR móvil
+VENTANA_MTTR = 4
+
+COLUMNAS_SEMANAL = ["semana", "categoria", "creadas", "cerradas", "reparaciones", "horas_reparacion"]
+COLUMNAS_TECNICOS = ["semana", "tecnico", "asignadas", "cerradas"]
+COLUMNAS_ACTIVOS = ["activo_id", "fallas", "cerradas", "reparaciones", "horas_reparacion", "mttr_horas", "ultima_falla"]
+
+
+def leer_por_rangos(armar_consulta, tam_pagina=TAM_PAGINA):
+    """Lee todas las filas de una consulta ordenada, de a `tam_pagina` con range()"""
+    filas, inicio = [], 0
+    while True:
+        lote = armar_consulta().range(inicio, inicio + tam_pagina - 1).execute().data
+        filas.extend(lote)
+        if len(lote) < tam_pagina:
+            return filas
+        inicio += tam_pagina
+
+
+def _fechas(valores):
+    return pd.to_datetime(valores, utc=True, errors="coerce", format="ISO8601").dt.tz_localize(None)
+
+
+def _semana(fechas):
+    return fechas.dt.to_period("W-SUN").dt.start_time
+
+
+def desde_filas(filas, columnas):
+    """DataFrame de un resumen leído de Supabase, con fechas y números ya convertidos"""
+    df = pd.DataFrame(filas, columns=columnas)
+    for columna in ("semana", "ultima_falla"):
+        if columna in df:
+            df[columna] = _fechas(df[columna].astype("string"))
+    for columna in ("creadas", "cerradas", "reparaciones", "asignadas", "fallas", "horas_reparacion", "mttr_horas"):
+        if columna in df:
+            df[columna] = pd.to_numeric(df[columna])
+    return df
+
+
+def rollups_desde_ordenes(df_ordenes, df_activos):
+    """Los tres resúmenes de sql/06 calculados en memoria: {"semanal", "tecnicos", "activos"}"""
+    if df_ordenes.empty or "fecha_creacion" not in df_ordenes:
+        return {
+            "semanal": pd.DataFrame(columns=COLUMNAS_SEMANAL),
+            "tecnicos": pd.DataFrame(columns=COLUMNAS_TECNICOS),
+            "activos": pd.DataFrame(columns=COLUMNAS_ACTIVOS),
+        }
+
+    creada = _fechas(df_ordenes["fecha_creacion"])
+    cerrada = df_ordenes["estado"] == "Concluida"
+    if "fecha_cierre" in df_ordenes:
+        fecha_cierre = _fechas(df_ordenes["fecha_cierre"])
+    else:
+        fecha_cierre = pd.Series(pd.NaT, index=df_ordenes.index, dtype="datetime64[ns]")
+    reparada = cerrada & fecha_cierre.notna()
+    # Sin fecha de cierre se cuenta como cerrada en su semana de creación
+    cierre = fecha_cierre.where(reparada, creada)
+    horas = ((cierre - creada).dt.total_seconds() / 3600).clip(lower=0).where(reparada, 0)
+
+    if df_activos.empty:
+        categoria = pd.Series("", index=df_ordenes.index)
+    else:
+        categoria = df_ordenes["activo_id"].map(df_activos.set_index("id")["categoria"].astype(object)).fillna("")
+    tecnico = df_ordenes.get("tecnico_asignado", pd.Series(None, index=df_ordenes.index)).astype(object).fillna("")
+
+    # Las creadas cuentan en su semana de creación; las cerradas y sus horas, en la de cierre
+    semanal = pd.concat([
+        pd.DataFrame({"semana": _semana(creada), "categoria": categoria, "creadas": 1, "cerradas": 0,
+                      "reparaciones": 0, "horas_reparacion": 0.0}),
+        pd.DataFrame({"semana": _semana(cierre), "categoria": categoria, "creadas": 0, "cerradas": 1,
+                      "reparaciones": reparada.astype(int), "horas_reparacion": horas})[cerrada],
+    ]).groupby(["semana", "categoria"], as_index=False).sum()
+
+    tecnicos = pd.concat([
+        pd.DataFrame({"semana": _semana(creada), "tecnico": tecnico, "asignadas": 1, "cerradas": 0}),
+        pd.DataFrame({"semana": _semana(cierre), "tecnico": tecnico, "asignadas": 0, "cerradas": 1})[cerrada],
+    ]).groupby(["semana", "tecnico"], as_index=False).sum()
+
+    # Las preventivas (sql/07) no cuentan como fallas del activo
+    correctiva = df_ordenes["preventiva"].ne(True) if "preventiva" in df_ordenes else pd.Series(True, index=df_ordenes.index)
+    activos = (
+        pd.DataFrame({"activo_id": df_ordenes["activo_id"], "cerradas": cerrada.astype(int), "reparaciones": reparada.astype(int),
+                      "horas_reparacion": horas, "creada": creada})[correctiva]
+        .dropna(subset=["activo_id"])
+        .groupby("activo_id")
+        .agg(fallas=("creada", "size"), cerradas=("cerradas", "sum"), reparaciones=("reparaciones", "sum"),
+             horas_reparacion=("horas_reparacion", "sum"), ultima_falla=("creada", "max"))
+        .reset_index()
+    )
+    activos["mttr_horas"] = activos["horas_reparacion"] / activos["reparaciones"].where(activos["reparaciones"] > 0)
+    return {"semanal": semanal, "tecnicos": tecnicos, "activos": activos[COLUMNAS_ACTIVOS]}
+
+
+def inicio_periodo(semanas, hoy=None):
+    """Lunes de la primera de las últimas `semanas` semanas (None = todo el histórico)"""
+    if not semanas:
+        return None
+    lunes = (hoy or pd.Timestamp.now(tz="UTC").tz_localize(None)).to_period("W-SUN").start_time
+    return lunes - pd.Timedelta(weeks=semanas - 1)
+
+
+def backlog_semanal(semanal, desde=None):
+    """Por semana: creadas, cerradas y OTs abiertas al final de la semana.
+    El acumulado usa todo el histórico; `desde` solo recorta lo que se muestra."""
+    if semanal.empty:
+        return pd.DataFrame(columns=["creadas", "cerradas", "abiertas"])
+    df = semanal.groupby("semana")[["creadas", "cerradas"]].sum().asfreq("W-MON", fill_value=0)
+    df["abiertas"] = (df["creadas"] - df["cerradas"]).cumsum()
+    return df if desde is None else df[df.index >= desde]
+
+
+def fallas_semanales(semanal, desde=None):
+    """OTs creadas por semana y categoría (frecuencia de fallas)"""
+    if semanal.empty:
+        return pd.DataFrame()
+    df = semanal.pivot_table(index="semana", columns="categoria", values="creadas", aggfunc="sum", fill_value=0)
+    df = df.asfreq("W-MON", fill_value=0)
+    return df if desde is None else df[df.index >= desde]
+
+
+def mttr_semanal(semanal, desde=None, ventana=VENTANA_MTTR):
+    """MTTR (horas) móvil de `ventana` semanas por categoría, más la columna "Todas".
+    Es el cociente de sumas móviles, así cada reparación pesa lo mismo."""
+    if semanal.empty:
+        return pd.DataFrame()
+    tabla = semanal.pivot_table(index="semana", columns="categoria", values=["reparaciones", "horas_reparacion"],
+                                aggfunc="sum", fill_value=0).asfreq("W-MON", fill_value=0)
+    movil = tabla.rolling(ventana, min_periods=1).sum()
+    reparaciones, horas = movil["reparaciones"], movil["horas_reparacion"]
+    df = horas / reparaciones.where(reparaciones > 0)
+    df["Todas"] = horas.sum(axis=1) / reparaciones.sum(axis=1).where(lambda total: total > 0)
+    return df if desde is None else df[df.index >= desde]
+
+
+def carga_tecnicos(tecnicos, desde=None):
+    """Por técnico: OTs asignadas y cerradas en el período y abiertas hoy"""
+    if tecnicos.empty:
+        return pd.DataFrame(columns=["asignadas", "cerradas", "abiertas"])
+    total = tecnicos.groupby("tecnico")[["asignadas", "cerradas"]].sum()
+    periodo = tecnicos if desde is None else tecnicos[tecnicos["semana"] >= desde]
+    df = periodo.groupby("tecnico")[["asignadas", "cerradas"]].sum().reindex(total.index, fill_value=0)
+    df["abiertas"] = total["asignadas"] - total["cerradas"]
+    df = df.rename(index={"": "(sin asignar)"})
+    return df[(df != 0).any(axis=1)].sort_values(["abiertas", "asignadas"], ascending=False)
+
+
+def top_activos(activos, df_nombres, por="fallas", n=10):
+    """Los `n` activos con más fallas o mayor MTTR (`por` = "fallas" o "mttr_horas"), con su nombre"""
+    if activos.empty:
+        return pd.DataFrame(columns=["activo", "categoria"] + COLUMNAS_ACTIVOS[1:])
+    df = activos.dropna(subset=[por]) if por == "mttr_horas" else activos
+    df = df.nlargest(n, por)
+    if df_nombres.empty:
+        nombres = pd.DataFrame(columns=["activo_id", "activo", "categoria"])
+    else:
+        nombres = df_nombres[["id", "nombre", "categoria"]].rename(columns={"id": "activo_id", "nombre": "activo"})
+    df = df.merge(nombres, on="activo_id", how="left")
+    df["activo"] = df["activo"].fillna("#" + df["activo_id"].astype(int).astype(str))
+    return df[["activo", "categoria"] + COLUMNAS_ACTIVOS[1:]].reset_index(drop=True)
@@ -1,21 +1,37 @@
 import streamlit as st
 import pandas as pd
 from supabase import create_client, Client
-from datetime import datetime
+from datetime import date, datetime, timezone
 from streamlit_option_menu import option_menu
 import io
 import urllib.parse
 import json
+import uuid
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from catalogos import CATEGORIAS, CRITICIDADES, ESTADOS_OT, ROLES, ESPECIALIDADES
+from sincronizacion import AlmacenInstantaneas
+from instrumentacion import ClienteInstrumentado, iniciar_medicion, UMBRAL_N_MAS_1
+from evidencias import SubidorEvidencias, LADO_MAX
+from cola_cierres import ColaCierres, RUTA_COLA
+from exportacion import FORMATOS, exportar_ordenes
+from importacion import ESQUEMAS, leer_archivo, validar, a_registros, insertar_por_lotes, total_lotes
+from en_vivo import SondeoOrdenes, VistaOrdenes, INTERVALO_EN_VIVO_SEGUNDOS
+import analitica
+from preventivo import DIAS_SEMANA, describir_programacion, proxima_desde
 
 # --- 1. CONFIGURACIÓN ---
 st.set_page_config(page_title="Gestión de Mantenimiento", layout="wide")
 
 # --- 2. CONEXIÓN A SUPABASE ---
+HISTORIAL_MEDICIONES = 20
+
 @st.cache_resource
 def init_supabase():
     url = st.secrets["SUPABASE_URL"]
     key = st.secrets["SUPABASE_KEY"]
-    return create_client(url, key)
+    return ClienteInstrumentado(create_client(url, key))
 
 try:
     supabase = init_supabase()
@@ -23,28 +39,297 @@ except Exception as e:
     st.error("Error conectando a Supabase. Revisa los Secrets.")
     st.stop()
 
+def abrir_medicion(pantalla):
+    """Archiva la medición anterior (ya terminó) e inicia la de esta ejecución"""
+    if 'id_sesion' not in st.session_state:
+        st.session_state['id_sesion'] = uuid.uuid4().hex[:8]
+    medicion_anterior = st.session_state.get('medicion')
+    if medicion_anterior is not None:
+        if medicion_anterior.duracion_ms is None:
+            medicion_anterior.finalizar(completa=False)
+        historial = st.session_state.setdefault('historial_mediciones', [])
+        historial.append(medicion_anterior.a_dict())
+        del historial[:-HISTORIAL_MEDICIONES]
+    nueva = iniciar_medicion(st.session_state['id_sesion'], st.session_state.get('usuario'), pantalla=pantalla)
+    st.session_state['medicion'] = nueva
+    return nueva
+
+medicion = abrir_medicion("Login")
+
 # --- 3. FUNCIONES AUXILIARES ---
 
-def run_query(table_name):
-    """Trae todos los datos de una tabla"""
+# Caché de lecturas. Las tablas completas viven en un almacén de instantáneas
+# que se sincroniza por deltas (sincronizacion.py); las consultas filtradas usan
+# st.cache_data con TTL y un máximo de entradas. Las escrituras llaman a
+# invalidar_cache() para refrescar solo la tabla afectada.
+CACHE_TTL_SEGUNDOS = 300
+CACHE_MAX_ENTRADAS = 32
+
+@st.cache_resource
+def _versiones_tablas():
+    """Versión de cada tabla, compartida entre sesiones"""
+    return {}
+
+@st.cache_resource
+def almacen_instantaneas():
+    """Instantáneas de tablas compartidas entre sesiones"""
+    return AlmacenInstantaneas(supabase)
+
+@st.cache_resource
+def vista_ordenes_en_vivo():
+    """Pendientes y conteos de órdenes para el modo en vivo, compartidos entre sesiones"""
+    return VistaOrdenes(SondeoOrdenes(supabase))
+
+def invalidar_cache(*tablas):
+    """Marca las tablas como modificadas para que la próxima lectura vaya a Supabase"""
+    versiones = _versiones_tablas()
+    almacen = almacen_instantaneas()
+    for tabla in tablas:
+        versiones[tabla] = versiones.get(tabla, 0) + 1
+        almacen.invalidar(tabla)
+    if "ordenes" in tablas:
+        vista_ordenes_en_vivo().invalidar()
+
+# Columnas que usan las pantallas: la contraseña de usuarios nunca se descarga
+COLUMNAS_ACTIVOS = ["nombre", "ubicacion", "categoria"]
+COLUMNAS_USUARIOS = ["documento", "nombre", "rol", "especialidad"]
+# Las agregaciones del tablero sin sql/01 y sql/06 comparten una sola instantánea de órdenes
+COLUMNAS_ORDENES_TABLERO = ["activo_id", "estado", "criticidad", "fecha_creacion", "fecha_cierre", "tecnico_asignado", "preventiva"]
+
+def run_query(table_name, columnas=None):
+    """Trae todas las filas de una tabla (sincronizada por deltas), solo con las
+    `columnas` pedidas (más id y updated_at) o con todas si es None"""
     try:
-        response = supabase.table(table_name).select("*").order("id").execute()
-        return pd.DataFrame(response.data)
+        return almacen_instantaneas().obtener(table_name, columnas)
     except Exception as e:
         return pd.DataFrame()
 
-def subir_imagen(archivo):
-    """Sube imagen al Bucket"""
+@st.cache_resource
+def _pool_consultas():
+    """Hilos para lanzar peticiones independientes a Supabase a la vez"""
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="consultas")
+
+def ejecutar_en_paralelo(*operaciones):
+    """Ejecuta funciones independientes a la vez y retorna sus resultados en orden.
+    Si alguna falla, se relanza su excepción (las demás igual se ejecutan, así que
+    no sirve para pasos que dependen de que otro haya salido bien)."""
+    # Cada hilo corre con una copia del contexto para que sus peticiones se midan en esta ejecución
+    futuros = [_pool_consultas().submit(contextvars.copy_context().run, operacion) for operacion in operaciones]
+    return [futuro.result() for futuro in futuros]
+
+# Selectores con búsqueda en el servidor: solo viajan los primeros resultados,
+# con las columnas que se muestran (nunca la contraseña)
+LIMITE_BUSQUEDA = 50
+COLUMNAS_BUSQUEDA = {"activos": COLUMNAS_ACTIVOS, "usuarios": COLUMNAS_USUARIOS}
+
+@st.cache_data(ttl=CACHE_TTL_SEGUNDOS, max_entries=CACHE_MAX_ENTRADAS, show_spinner=False)
+def _buscar_registros(tabla, texto, columnas, limite, version):
+    """Primeros `limite` registros cuyo texto coincide (ilike) en alguna de las columnas"""
+    query = supabase.table(tabla).select(", ".join(["id"] + COLUMNAS_BUSQUEDA[tabla]))
+    if texto:
+        patron = texto.replace("\\", "\\\\").replace('"', '\\"')
+        query = query.or_(",".join(f'{col}.ilike."*{patron}*"' for col in columnas))
+    response = query.order(columnas[0]).limit(limite).execute()
+    # Índice por id para recuperar el registro elegido sin recorrer la lista
+    return {registro['id']: registro for registro in response.data}
+
+def buscar_registros(tabla, texto, columnas, limite=LIMITE_BUSQUEDA):
+    """Registros que coinciden con el texto, como dict {id: registro}"""
+    try:
+        return _buscar_registros(tabla, texto, columnas, limite, _versiones_tablas().get(tabla, 0))
+    except Exception as e:
+        return {}
+
+def selector_busqueda(etiqueta, tabla, columnas, formato, key, vacio=None):
+    """Cuadro de búsqueda + selectbox con las coincidencias. Retorna el registro elegido o None"""
+    texto = st.text_input(f"🔍 {etiqueta}", key=f"{key}_texto", placeholder="Escribe para buscar...").strip()
+    registros = buscar_registros(tabla, texto, columnas)
+    if not registros:
+        if texto:
+            st.info("Sin coincidencias.")
+        elif vacio:
+            st.info(vacio)
+        return None
+    id_elegido = st.selectbox(etiqueta, list(registros), format_func=lambda i: formato(registros[i]), key=f"{key}_id")
+    if len(registros) == LIMITE_BUSQUEDA:
+        st.caption(f"Se muestran los primeros {LIMITE_BUSQUEDA} resultados; escribe más para afinar la búsqueda.")
+    return registros[id_elegido]
+
+def datos_privados_usuario(id_usuario):
+    """Email y contraseña del usuario que se está editando. Se leen por id y quedan
+    en la sesión, no en st.cache_data (compartida entre sesiones)"""
+    clave = (int(id_usuario), _versiones_tablas().get("usuarios", 0))
+    guardados = st.session_state.get('datos_privados_usuario')
+    if guardados is None or guardados[0] != clave:
+        response = supabase.table("usuarios").select("email, password").eq("id", clave[0]).execute()
+        guardados = (clave, response.data[0] if response.data else {})
+        st.session_state['datos_privados_usuario'] = guardados
+    return guardados[1]
+
+LIMITE_BAJA_MASIVA = 500
+
+def dar_de_baja_activos(ids, motivo, usuario):
+    """Respalda en auditoría y elimina los activos junto con sus OTs.
+    Usa la función dar_de_baja_activos de la base (sql/04_baja_activos.sql), que lo hace
+    en una sola transacción; si aún no está instalada, lo hace con peticiones separadas."""
+    ids = [int(i) for i in ids]
+    try:
+        supabase.rpc("dar_de_baja_activos", {"p_ids": ids, "p_motivo": motivo, "p_usuario": usuario}).execute()
+    except Exception as e:
+        # PGRST202: la función no existe en la base
+        if getattr(e, "code", None) != "PGRST202" and "Could not find the function" not in str(e):
+            raise
+        activos = supabase.table("activos").select("id, nombre, ubicacion, categoria").in_("id", ids).execute().data
+        respaldos = [{
+            "tipo_registro": "Activo",
+            "nombre_referencia": a['nombre'],
+            "datos_respaldo": {"id_original": a['id'], "nombre": a['nombre'], "ubicacion": a['ubicacion'], "categoria": a['categoria'], "motivo_baja": motivo},
+            "usuario_responsable": usuario
+        } for a in activos]
+        # El respaldo va antes que cualquier borrado: si falla, no se elimina nada
+        supabase.table("auditoria_eliminados").insert(respaldos).execute()
+        supabase.table("ordenes").delete().in_("activo_id", ids).execute()
+        supabase.table("activos").delete().in_("id", ids).execute()
+    finally:
+        invalidar_cache("activos", "ordenes", "auditoria_eliminados")
+
+def ejecutar_importacion(importacion, lotes=None):
+    """Inserta los registros de una importación mostrando el avance.
+    Guarda en importacion['fallidos'] los lotes que no se pudieron escribir."""
+    barra = st.progress(0.0, text="Importando...")
+    importacion['fallidos'] = insertar_por_lotes(
+        supabase, importacion['tabla'], importacion['registros'], lotes=lotes,
+        al_avanzar=lambda hechos, total: barra.progress(hechos / total, text=f"Lote {hechos} de {total}")
+    )
+    invalidar_cache(importacion['tabla'])
+
+@st.cache_data(ttl=CACHE_TTL_SEGUNDOS, max_entries=CACHE_MAX_ENTRADAS, show_spinner=False)
+def _consultar_resumen_ordenes(version):
+    """Lee la tabla resumen_ordenes (ver sql/01_resumen_ordenes.sql)"""
+    response = supabase.table("resumen_ordenes").select("estado, criticidad, total").execute()
+    return pd.DataFrame(response.data, columns=["estado", "criticidad", "total"])
+
+def resumen_ordenes():
+    """Conteo de OTs por estado y criticidad.
+    Si la tabla resumen aún no existe en la base, se agrega en memoria."""
+    try:
+        df = _consultar_resumen_ordenes(_versiones_tablas().get("ordenes", 0))
+    except Exception as e:
+        df_ordenes = run_query("ordenes", COLUMNAS_ORDENES_TABLERO)
+        if df_ordenes.empty:
+            return pd.DataFrame(columns=["estado", "criticidad", "total"])
+        df = df_ordenes.groupby(["estado", "criticidad"], observed=True).size().reset_index(name="total")
+    return df[df["total"] > 0]
+
+@st.cache_data(ttl=CACHE_TTL_SEGUNDOS, max_entries=CACHE_MAX_ENTRADAS, show_spinner=False)
+def _consultar_analitica(version_ordenes, version_activos, top):
+    """Lee los resúmenes de sql/06_analitica.sql: todas las semanas y solo los
+    activos con más fallas y mayor MTTR (no el resumen completo de activos)"""
+    columnas_activos = ", ".join(analitica.COLUMNAS_ACTIVOS)
+    semanal, tecnicos, mas_fallas, mayor_mttr = ejecutar_en_paralelo(
+        lambda: analitica.leer_por_rangos(lambda: supabase.table("analitica_semanal").select(", ".join(analitica.COLUMNAS_SEMANAL)).order("semana").order("categoria")),
+        lambda: analitica.leer_por_rangos(lambda: supabase.table("analitica_tecnicos").select(", ".join(analitica.COLUMNAS_TECNICOS)).order("semana").order("tecnico")),
+        lambda: supabase.table("analitica_activos").select(columnas_activos).gt("fallas", 0).order("fallas", desc=True).limit(top).execute().data,
+        lambda: supabase.table("analitica_activos").select(columnas_activos).gt("reparaciones", 0).order("mttr_horas", desc=True).limit(top).execute().data,
+    )
+    activos = analitica.desde_filas(mas_fallas + mayor_mttr, analitica.COLUMNAS_ACTIVOS).drop_duplicates("activo_id")
+    nombres = supabase.table("activos").select("id, nombre, categoria").in_("id", activos["activo_id"].tolist()).execute().data
+    return {
+        "semanal": analitica.desde_filas(semanal, analitica.COLUMNAS_SEMANAL),
+        "tecnicos": analitica.desde_filas(tecnicos, analitica.COLUMNAS_TECNICOS),
+        "activos": activos,
+        "nombres": pd.DataFrame(nombres, columns=["id", "nombre", "categoria"]),
+    }
+
+def resumenes_analitica(top=10):
+    """Resúmenes para las tendencias del tablero.
+    Si las tablas de sql/06 aún no existen en la base, se calculan en memoria."""
+    versiones = _versiones_tablas()
+    try:
+        return _consultar_analitica(versiones.get("ordenes", 0), versiones.get("activos", 0), top)
+    except Exception as e:
+        df_activos = run_query("activos", COLUMNAS_ACTIVOS)
+        df_ordenes = run_query("ordenes", COLUMNAS_ORDENES_TABLERO)
+        resumenes = analitica.rollups_desde_ordenes(df_ordenes, df_activos)
+        resumenes["nombres"] = df_activos
+        return resumenes
+
+OTS_POR_PAGINA = 25
+
+@st.cache_data(ttl=CACHE_TTL_SEGUNDOS, max_entries=CACHE_MAX_ENTRADAS, show_spinner=False)
+def _consultar_ots_pendientes(tecnico, despues_de_id, limite, version):
+    """Página de OTs no concluidas, filtrada en Supabase"""
+    query = supabase.table("ordenes").select("*").neq("estado", "Concluida")
+    if tecnico:
+        query = query.eq("tecnico_asignado", tecnico)
+    # Se pide una fila extra solo para saber si existe una página siguiente
+    response = query.gt("id", despues_de_id).order("id").limit(limite + 1).execute()
+    return pd.DataFrame(response.data)
+
+def consultar_ots_pendientes(tecnico=None, despues_de_id=0, limite=OTS_POR_PAGINA):
+    """Trae hasta `limite` OTs pendientes con id mayor a `despues_de_id`.
+    Retorna (DataFrame, hay_mas)"""
+    try:
+        df = _consultar_ots_pendientes(tecnico, despues_de_id, limite, _versiones_tablas().get("ordenes", 0))
+    except Exception as e:
+        return pd.DataFrame(), False
+    return df.head(limite), len(df) > limite
+
+@st.cache_resource
+def subidor_evidencias():
+    """Procesa y sube las evidencias que envía la cola de cierres"""
+    lado_max = int(st.secrets.get("EVIDENCIA_LADO_MAX", LADO_MAX))
+    return SubidorEvidencias(supabase, lado_max=lado_max)
+
+@st.cache_resource
+def cola_cierres():
+    """Cola local de cierres (SQLite), enviada a Supabase por lotes en segundo plano"""
+    return ColaCierres(
+        supabase, subidor_evidencias(), ruta=st.secrets.get("COLA_CIERRES_RUTA", RUTA_COLA),
+        al_aplicar=lambda ots: invalidar_cache("ordenes"),
+    )
+
+# Cada cuánto se refresca el estado de la cola mientras tiene cierres por enviar
+INTERVALO_COLA_SEGUNDOS = 2
+
+def cerrar_orden(ot_id, comentarios, archivo=None):
+    """Registra el cierre en la cola local; la evidencia se reduce y se sube al enviarlo"""
     if archivo:
-        try:
-            file_name = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{archivo.name}"
-            bucket_name = "evidencias"
-            file_bytes = archivo.getvalue()
-            supabase.storage.from_(bucket_name).upload(path=file_name, file=file_bytes, file_options={"content-type": archivo.type})
-            return supabase.storage.from_(bucket_name).get_public_url(file_name)
-        except Exception:
-            return None
-    return None
+        cola_cierres().encolar(ot_id, comentarios, archivo.getvalue(), archivo.name, archivo.type)
+    else:
+        cola_cierres().encolar(ot_id, comentarios)
+
+# Reruns parciales: las partes interactivas de cada pantalla son fragmentos, así
+# un widget solo vuelve a ejecutar su fragmento (sin menú lateral ni el resto de
+# consultas de la página). Tras escribir en la base se sigue usando st.rerun(),
+# que recarga la app completa para que las demás partes vean el cambio.
+def fragmento(func=None, *, run_every=None):
+    """st.fragment que registra sus reruns parciales como una medición propia.
+    Con `run_every` (segundos) el fragmento se vuelve a ejecutar solo (modo en vivo)."""
+    if func is None:
+        return functools.partial(fragmento, run_every=run_every)
+
+    @functools.wraps(func)
+    def ejecutar(*args, **kwargs):
+        if medicion.duracion_ms is None:
+            # Dentro de la ejecución completa: la medición de la página ya está activa
+            return func(*args, **kwargs)
+        parcial = abrir_medicion(f"{medicion.pantalla} · {func.__name__}")
+        resultado = func(*args, **kwargs)
+        parcial.finalizar()
+        return resultado
+    return st.fragment(ejecutar, run_every=run_every)
+
+def selector_en_vivo():
+    """Interruptor del modo en vivo. Retorna la vista de órdenes si está activo y disponible"""
+    if not st.toggle("🔴 En vivo", key="en_vivo", help=f"Actualiza esta pantalla cada {INTERVALO_EN_VIVO_SEGUNDOS} s con los cambios de las órdenes"):
+        return None
+    vista = vista_ordenes_en_vivo()
+    vista.actualizar()
+    if vista.error:
+        st.warning(f"Modo en vivo no disponible (requiere sql/01 y sql/02): {vista.error}")
+        return None
+    return vista
 
 # --- 4. SISTEMA DE LOGIN Y SESIÓN ---
 
@@ -66,7 +351,7 @@ def login():
             
             if submitted:
                 try:
-                    response = supabase.table("usuarios").select("*").eq("documento", documento).eq("password", password).execute()
+                    response = supabase.table("usuarios").select("documento, nombre, rol").eq("documento", documento).eq("password", password).execute()
                     if response.data:
                         user_data = response.data[0]
                         st.session_state['usuario'] = user_data['nombre']
@@ -129,136 +414,413 @@ else:
                 "nav-link-selected": {"background-image": "linear-gradient(to right, #00b09b, #96c93d)", "color": "white", "font-weight": "bold", "box-shadow": "0px 4px 15px rgba(0,0,0,0.3)"},
             }
         )
+        medicion.pantalla = choice
+
+        # PANEL DE RENDIMIENTO (solo Admin): datos de la ejecución anterior, que ya terminó
+        if rol_actual == "Admin":
+            with st.expander("⏱️ Rendimiento"):
+                historial = st.session_state.get('historial_mediciones', [])
+                if historial:
+                    ultima = historial[-1]
+                    st.caption(f"Última ejecución · {ultima['pantalla']}")
+                    c1, c2 = st.columns(2)
+                    c1.metric("Round trips", ultima['round_trips'])
+                    c2.metric("Duración", f"{ultima['duracion_ms']:.0f} ms" if ultima['duracion_ms'] is not None else "—")
+                    c1.metric("Filas", ultima['filas'])
+                    c2.metric("KB recibidos", f"{ultima['bytes'] / 1024:.1f}")
+                    if ultima['detalle']:
+                        st.dataframe(pd.DataFrame(ultima['detalle']), hide_index=True, use_container_width=True)
+                        repetidas = [d for d in ultima['detalle'] if d['llamadas'] >= UMBRAL_N_MAS_1]
+                        for d in repetidas:
+                            st.warning(f"Posible N+1: {d['llamadas']} llamadas a {d['tabla']} ({d['operacion']})")
+                    st.caption("Por pantalla (sesión actual)")
+                    df_hist = pd.DataFrame(historial)
+                    st.dataframe(
+                        df_hist.groupby("pantalla").agg(ejecuciones=("round_trips", "size"), round_trips=("round_trips", "mean"),
+                                                        duracion_ms=("duracion_ms", "mean"), ms_consultas=("ms_consultas", "mean")).round(1),
+                        use_container_width=True
+                    )
+                else:
+                    st.caption("Sin mediciones todavía.")
 
     # --- PANTALLAS ---
 
     # 1. DASHBOARD
     if choice == "Dashboard":
         st.subheader("Tablero de Control")
-        df_ordenes = run_query("ordenes")
-        if not df_ordenes.empty:
-            c1, c2, c3 = st.columns(3)
-            c1.metric("Total OTs", len(df_ordenes), delta="Global")
-            c2.metric("Abiertas", len(df_ordenes[df_ordenes['estado']=='Abierta']), delta="Pendientes", delta_color="inverse")
-            c3.metric("Concluidas", len(df_ordenes[df_ordenes['estado']=='Concluida']), delta="Finalizadas", delta_color="normal")
+        vista = selector_en_vivo()
+
+        @fragmento(run_every=INTERVALO_EN_VIVO_SEGUNDOS if vista else None)
+        def tablero():
+            if vista:
+                # En vivo: la vista compartida ya trae aplicados los cambios del último intervalo
+                vista.actualizar()
+                if vista.error:
+                    st.warning(f"No se pudieron traer los últimos cambios: {vista.error}")
+                df_resumen = vista.resumen
+                st.caption(f"🔴 En vivo · actualizado {vista.actualizada_en:%H:%M:%S}")
+            else:
+                df_resumen = resumen_ordenes()
+            if not df_resumen.empty:
+                por_estado = df_resumen.groupby("estado")["total"].sum().sort_values(ascending=False)
+                por_criticidad = df_resumen.groupby("criticidad")["total"].sum().sort_values(ascending=False)
+
+                c1, c2, c3 = st.columns(3)
+                c1.metric("Total OTs", int(por_estado.sum()), delta="Global")
+                c2.metric("Abiertas", int(por_estado.get('Abierta', 0)), delta="Pendientes", delta_color="inverse")
+                c3.metric("Concluidas", int(por_estado.get('Concluida', 0)), delta="Finalizadas", delta_color="normal")
             
-            st.divider()
-            col_a, col_b = st.columns(2)
-            col_a.write("### Estado de Órdenes")
-            col_a.bar_chart(df_ordenes['estado'].value_counts(), color="#00b09b") 
-            col_b.write("### Criticidad")
-            col_b.bar_chart(df_ordenes['criticidad'].value_counts(), color="#ff6b6b") 
-        else:
-            st.info("Sin datos para mostrar.")
+                st.divider()
+                col_a, col_b = st.columns(2)
+                col_a.write("### Estado de Órdenes")
+                col_a.bar_chart(por_estado, color="#00b09b") 
+                col_b.write("### Criticidad")
+                col_b.bar_chart(por_criticidad, color="#ff6b6b") 
+            else:
+                st.info("Sin datos para mostrar.")
+        tablero()
+
+        st.divider()
+        @fragmento
+        def tendencias():
+            st.write("### 📈 Tendencias")
+            periodos = {"12 semanas": 12, "26 semanas": 26, "52 semanas": 52, "Todo": None}
+            periodo = st.radio("Período", list(periodos), index=1, horizontal=True, key="periodo_tendencias")
+            desde = analitica.inicio_periodo(periodos[periodo])
+            resumenes = resumenes_analitica()
+            if resumenes["semanal"].empty:
+                st.info("Sin datos para mostrar.")
+                return
+
+            t1, t2, t3, t4 = st.tabs(["📋 Backlog", "⏱️ MTTR", "⚠️ Fallas", "👷 Carga por técnico"])
+            with t1:
+                backlog = analitica.backlog_semanal(resumenes["semanal"], desde)
+                st.caption("OTs abiertas al cierre de cada semana")
+                st.line_chart(backlog["abiertas"], color="#ff6b6b")
+                st.caption("Creadas vs. cerradas por semana")
+                st.bar_chart(backlog[["creadas", "cerradas"]], stack=False)
+            with t2:
+                mttr = analitica.mttr_semanal(resumenes["semanal"], desde)
+                st.caption(f"Horas promedio de reparación por categoría (media móvil de {analitica.VENTANA_MTTR} semanas)")
+                st.line_chart(mttr)
+            with t3:
+                st.caption("OTs creadas por semana y categoría")
+                st.bar_chart(analitica.fallas_semanales(resumenes["semanal"], desde))
+                c1, c2 = st.columns(2)
+                c1.write("**Activos con más fallas** (histórico)")
+                c1.dataframe(analitica.top_activos(resumenes["activos"], resumenes["nombres"], "fallas"), hide_index=True)
+                c2.write("**Activos con mayor MTTR** (horas, histórico)")
+                c2.dataframe(analitica.top_activos(resumenes["activos"], resumenes["nombres"], "mttr_horas"), hide_index=True)
+            with t4:
+                st.caption("Asignadas y cerradas en el período; abiertas a hoy")
+                st.dataframe(analitica.carga_tecnicos(resumenes["tecnicos"], desde), use_container_width=True)
+        tendencias()
+
+        st.divider()
+        @fragmento
+        def panel_exportacion():
+            with st.expander("📤 Exportar historial de órdenes"):
+                c1, c2, c3 = st.columns(3)
+                rango = c1.date_input("Rango de fechas (creación)", value=(), format="DD/MM/YYYY")
+                estados_exp = c2.multiselect("Estado", ESTADOS_OT)
+                formato = c3.radio("Formato", list(FORMATOS), horizontal=True)
+                if st.button("Generar archivo"):
+                    desde, hasta = (list(rango) + [None, None])[:2]
+                    barra = st.progress(0.0, text="Exportando...")
+                    try:
+                        datos = exportar_ordenes(
+                            supabase, formato, run_query("activos", COLUMNAS_ACTIVOS), desde, hasta, estados_exp,
+                            al_avanzar=lambda hechas, total: barra.progress(min(hechas / total, 1.0), text=f"{hechas} de {total} órdenes")
+                        )
+                    except Exception as e:
+                        st.error(f"Error al exportar: {e}")
+                    else:
+                        extension, mime = FORMATOS[formato]
+                        st.download_button(f"⬇️ Descargar ordenes.{extension}", datos, file_name=f"ordenes_{datetime.now().strftime('%Y%m%d')}.{extension}", mime=mime)
+        panel_exportacion()
 
     # 2. GESTIÓN DE ACTIVOS
     elif choice == "Gestión de Activos":
         st.subheader("Inventario de Equipos")
-        df_activos = run_query("activos")
         
-        tab1, tab2 = st.tabs(["➕ Registrar Nuevo", "✏️ Editar / Dar de Baja"])
+        tab1, tab2, tab3 = st.tabs(["➕ Registrar Nuevo", "✏️ Editar / Dar de Baja", "📥 Importación Masiva"])
         
         with tab1:
             with st.form("form_activo", clear_on_submit=True):
                 c1, c2 = st.columns(2)
                 nombre = c1.text_input("Nombre del Equipo")
                 ubicacion = c2.text_input("Ubicación")
-                categoria = st.selectbox("Categoría", ["Mecánico", "Eléctrico", "Infraestructura", "HVAC", "Otros"])
+                categoria = st.selectbox("Categoría", CATEGORIAS)
                 if st.form_submit_button("Guardar Activo"):
                     if nombre and ubicacion:
                         supabase.table("activos").insert({"nombre": nombre, "ubicacion": ubicacion, "categoria": categoria}).execute()
+                        invalidar_cache("activos")
                         st.success("Activo creado!")
                         st.rerun()
                     else:
                         st.warning("Faltan datos.")
 
         with tab2:
-            if not df_activos.empty:
-                activos_dict = {f"{row['nombre']} - {row['ubicacion']}": row['id'] for i, row in df_activos.iterrows()}
-                seleccion = st.selectbox("Seleccionar Activo", list(activos_dict.keys()))
-                id_seleccionado = activos_dict[seleccion]
-                datos_actuales = df_activos[df_activos['id'] == id_seleccionado].iloc[0]
+            @fragmento
+            def editar_activo():
+                datos_actuales = selector_busqueda(
+                    "Seleccionar Activo", "activos", ("nombre", "ubicacion"),
+                    lambda r: f"{r['nombre']} - {r['ubicacion']}", key="buscar_activo", vacio="No hay activos registrados."
+                )
+                if datos_actuales is not None:
+                    id_seleccionado = datos_actuales['id']
                 
-                with st.form("form_editar"):
-                    nuevo_nombre = st.text_input("Nombre", value=datos_actuales['nombre'])
-                    nueva_ubicacion = st.text_input("Ubicación", value=datos_actuales['ubicacion'])
-                    if st.form_submit_button("Actualizar"):
-                        supabase.table("activos").update({"nombre": nuevo_nombre, "ubicacion": nueva_ubicacion}).eq("id", int(id_seleccionado)).execute()
-                        st.success("Actualizado.")
-                        st.rerun()
+                    with st.form("form_editar"):
+                        nuevo_nombre = st.text_input("Nombre", value=datos_actuales['nombre'])
+                        nueva_ubicacion = st.text_input("Ubicación", value=datos_actuales['ubicacion'])
+                        if st.form_submit_button("Actualizar"):
+                            supabase.table("activos").update({"nombre": nuevo_nombre, "ubicacion": nueva_ubicacion}).eq("id", int(id_seleccionado)).execute()
+                            invalidar_cache("activos")
+                            st.success("Actualizado.")
+                            st.rerun()
                 
-                st.markdown("---")
-                with st.expander("🗑️ Zona de Peligro (Baja)"):
-                    usuario_baja = st.text_input("👤 Responsable de la Baja:")
-                    motivo = st.text_area("Motivo:")
-                    if st.button("Dar de Baja", type="primary", disabled=(not motivo or not usuario_baja)):
-                        backup = {
-                            "id_original": int(id_seleccionado),
-                            "nombre": datos_actuales['nombre'],
-                            "ubicacion": datos_actuales['ubicacion'],
-                            "categoria": datos_actuales['categoria'],
-                            "motivo_baja": motivo
-                        }
-                        supabase.table("auditoria_eliminados").insert({
-                            "tipo_registro": "Activo",
-                            "nombre_referencia": datos_actuales['nombre'],
-                            "datos_respaldo": backup,
-                            "usuario_responsable": usuario_baja
-                        }).execute()
-                        
-                        supabase.table("ordenes").delete().eq("activo_id", int(id_seleccionado)).execute()
-                        supabase.table("activos").delete().eq("id", int(id_seleccionado)).execute()
-                        st.success("Eliminado")
-                        st.rerun()
+                    st.markdown("---")
+                    with st.expander("🗑️ Zona de Peligro (Baja)"):
+                        usuario_baja = st.text_input("👤 Responsable de la Baja:")
+                        motivo = st.text_area("Motivo:")
+                        if st.button("Dar de Baja", type="primary", disabled=(not motivo or not usuario_baja)):
+                            try:
+                                dar_de_baja_activos([id_seleccionado], motivo, usuario_baja)
+                                st.success("Eliminado")
+                                st.rerun()
+                            except Exception as e:
+                                st.error(f"Error al dar de baja: {e}")
+            editar_activo()
+
+            # --- BAJA MASIVA ---
+            st.markdown("---")
+            @fragmento
+            def baja_masiva():
+                with st.expander("🗑️ Baja Masiva"):
+                    texto_lote = st.text_input("🔍 Filtrar activos (nombre o ubicación)", key="baja_lote_texto").strip()
+                    # Se pide uno más del límite solo para saber si hay más coincidencias
+                    candidatos = buscar_registros("activos", texto_lote, ("nombre", "ubicacion"), LIMITE_BAJA_MASIVA + 1)
+                    truncado = len(candidatos) > LIMITE_BAJA_MASIVA
+                    candidatos = dict(list(candidatos.items())[:LIMITE_BAJA_MASIVA])
+                    if candidatos:
+                        if truncado:
+                            st.warning(f"Más de {LIMITE_BAJA_MASIVA} activos coinciden; solo se muestran los primeros {LIMITE_BAJA_MASIVA}. "
+                                       "Afina el filtro para poder seleccionarlos todos.")
+                        # "Todos" solo con un filtro escrito y con la lista completa de coincidencias
+                        puede_todos = bool(texto_lote) and not truncado
+                        todos = st.checkbox(
+                            f"Seleccionar los {len(candidatos)} activos que coinciden con el filtro", key="baja_lote_todos",
+                            disabled=not puede_todos, help=None if puede_todos else "Escribe un filtro que abarque menos activos para seleccionarlos todos.",
+                        ) and puede_todos
+                        if todos:
+                            ids_lote = list(candidatos)
+                        else:
+                            ids_lote = st.multiselect("Activos a dar de baja", list(candidatos), format_func=lambda i: f"{candidatos[i]['nombre']} - {candidatos[i]['ubicacion']}", key="baja_lote_ids")
+                        usuario_lote = st.text_input("👤 Responsable de la Baja:", key="baja_lote_usuario")
+                        motivo_lote = st.text_area("Motivo:", key="baja_lote_motivo")
+                        if st.button(f"Dar de Baja ({len(ids_lote)})", type="primary", disabled=(not ids_lote or not motivo_lote or not usuario_lote)):
+                            try:
+                                dar_de_baja_activos(ids_lote, motivo_lote, usuario_lote)
+                                st.success(f"{len(ids_lote)} activos eliminados")
+                                st.rerun()
+                            except Exception as e:
+                                st.error(f"Error al dar de baja: {e}")
+                    else:
+                        st.info("Sin coincidencias.")
+            baja_masiva()
+
+        with tab3:
+            @fragmento
+            def importacion_masiva():
+                if 'import_key' not in st.session_state:
+                    st.session_state['import_key'] = 0
+
+                # --- IMPORTACIÓN EN CURSO (permite reanudar lotes fallidos) ---
+                importacion = st.session_state.get('importacion')
+                if importacion:
+                    fallidos = importacion['fallidos']
+                    if fallidos:
+                        st.error(f"⛔ {len(fallidos)} de {total_lotes(importacion['registros'])} lotes no se pudieron guardar.")
+                        st.dataframe(pd.DataFrame({"lote": [l + 1 for l in fallidos], "error": list(fallidos.values())}), use_container_width=True)
+                        c1, c2 = st.columns(2)
+                        if c1.button("🔁 Reintentar lotes fallidos", type="primary", use_container_width=True):
+                            ejecutar_importacion(importacion, lotes=fallidos.keys())
+                            st.rerun()
+                        if c2.button("Descartar", use_container_width=True):
+                            del st.session_state['importacion']
+                            st.rerun()
+                    else:
+                        st.success(f"✅ {len(importacion['registros'])} registros importados en {importacion['tabla']}.")
+                        del st.session_state['importacion']
+                    st.markdown("---")
+
+                tipo_import = st.radio("Datos a importar", ["Activos", "Órdenes históricas"], horizontal=True)
+                tabla_import = "activos" if tipo_import == "Activos" else "ordenes"
+                esquema = ESQUEMAS[tabla_import]
+                st.caption(f"Columnas obligatorias: {', '.join(esquema['obligatorias'])}"
+                           + (f" · Opcionales: {', '.join(esquema['opcionales'])}" if esquema['opcionales'] else ""))
+
+                archivo = st.file_uploader("Archivo CSV o Excel", type=["csv", "xlsx"], key=f"import_{tabla_import}_{st.session_state['import_key']}")
+                if archivo:
+                    try:
+                        ids_activos = run_query("activos", COLUMNAS_ACTIVOS)['id'] if tabla_import == "ordenes" else []
+                        validas, errores = validar(tabla_import, leer_archivo(archivo.name, archivo.getvalue()), ids_activos)
+                    except ValueError as e:
+                        st.error(f"⛔ {e}")
+                    except Exception as e:
+                        st.error(f"No se pudo leer el archivo: {e}")
+                    else:
+                        c1, c2 = st.columns(2)
+                        c1.metric("Filas válidas", len(validas))
+                        c2.metric("Filas con errores", len(errores))
+                        if not errores.empty:
+                            st.warning("Las filas con errores no se importarán.")
+                            st.dataframe(errores, use_container_width=True)
+                        if st.button("Importar filas válidas", type="primary", disabled=validas.empty):
+                            importacion = {"tabla": tabla_import, "registros": a_registros(validas), "fallidos": {}}
+                            st.session_state['importacion'] = importacion
+                            ejecutar_importacion(importacion)
+                            st.session_state['import_key'] += 1
+                            st.rerun()
+            importacion_masiva()
+
     
     # 3. CREAR ORDEN Y ASIGNAR
     elif choice == "Crear Orden":
         st.subheader("Planificación y Asignación de OTs")
+        tab_ot, tab_planes = st.tabs(["➕ OT Correctiva", "🗓️ Planes Preventivos"])
+
+        with tab_ot:
+            @fragmento
+            def formulario_orden():
+                df_usuarios = run_query("usuarios", COLUMNAS_USUARIOS)
         
-        df_activos = run_query("activos")
-        df_usuarios = run_query("usuarios")
-        
-        lista_tecnicos = []
-        if not df_usuarios.empty:
-            tecnicos = df_usuarios[df_usuarios['rol'].isin(['Tecnico', 'Admin', 'Programador'])]
-            lista_tecnicos = tecnicos['nombre'].tolist()
-
-        if not df_activos.empty:
-            activos_dict = {f"{row['nombre']}": row['id'] for i, row in df_activos.iterrows()}
-            seleccion = st.selectbox("Equipo", list(activos_dict.keys()))
-            activo_id = activos_dict[seleccion]
+                lista_tecnicos = []
+                if not df_usuarios.empty:
+                    tecnicos = df_usuarios[df_usuarios['rol'].isin(['Tecnico', 'Admin', 'Programador'])]
+                    lista_tecnicos = tecnicos['nombre'].tolist()
+
+                activo = selector_busqueda("Equipo", "activos", ("nombre", "ubicacion"), lambda r: r['nombre'],
+                                           key="buscar_equipo", vacio="No hay activos registrados.")
+                if activo is not None:
+                    activo_id = activo['id']
+                    seleccion = activo['nombre']
             
-            c1, c2 = st.columns(2)
-            descripcion = c1.text_area("Descripción")
-            asignado_a = c2.selectbox("Asignar Técnico Responsable", lista_tecnicos)
+                    c1, c2 = st.columns(2)
+                    descripcion = c1.text_area("Descripción")
+                    asignado_a = c2.selectbox("Asignar Técnico Responsable", lista_tecnicos)
             
-            criticidad = st.select_slider("Criticidad", ["Baja", "Media", "Alta", "Crítica"])
+                    criticidad = st.select_slider("Criticidad", CRITICIDADES)
             
-            if st.button("Generar y Asignar"):
-                datos = {
-                    "activo_id": int(activo_id),
-                    "descripcion": descripcion,
-                    "criticidad": criticidad,
-                    "estado": "Abierta",
-                    "fecha_creacion": datetime.now().isoformat(),
-                    "tecnico_asignado": asignado_a
-                }
-                res = supabase.table("ordenes").insert(datos).execute()
-                if res.data:
-                    new_id = res.data[0]['id']
-                    texto = f"*NUEVA ASIGNACIÓN OT #{new_id}*\nResp: {asignado_a}\nEquipo: {seleccion}\nFalla: {descripcion}"
-                    texto_enc = urllib.parse.quote(texto)
+                    if st.button("Generar y Asignar"):
+                        datos = {
+                            "activo_id": int(activo_id),
+                            "descripcion": descripcion,
+                            "criticidad": criticidad,
+                            "estado": "Abierta",
+                            # En UTC y con zona, igual que la fecha de cierre que envía la cola: el MTTR es su diferencia
+                            "fecha_creacion": datetime.now(timezone.utc).isoformat(),
+                            "tecnico_asignado": asignado_a
+                        }
+                        res = supabase.table("ordenes").insert(datos).execute()
+                        invalidar_cache("ordenes")
+                        if res.data:
+                            new_id = res.data[0]['id']
+                            texto = f"*NUEVA ASIGNACIÓN OT #{new_id}*\nResp: {asignado_a}\nEquipo: {seleccion}\nFalla: {descripcion}"
+                            texto_enc = urllib.parse.quote(texto)
                     
-                    st.balloons()
-                    st.markdown(f"""
-                        <div style="background-color:#d4edda; color:#155724; padding:20px; border-radius:10px; text-align:center;">
-                            <h2 style="margin:0;">✅ OT #{new_id} Creada</h2>
-                            <p>Asignada a: <strong>{asignado_a}</strong></p>
-                        </div>
-                    """, unsafe_allow_html=True)
-                    st.link_button("📲 Enviar WhatsApp al Técnico", f"https://wa.me/?text={texto_enc}")
-        else:
-            st.warning("No hay activos registrados.")
+                            st.balloons()
+                            st.markdown(f"""
+                                <div style="background-color:#d4edda; color:#155724; padding:20px; border-radius:10px; text-align:center;">
+                                    <h2 style="margin:0;">✅ OT #{new_id} Creada</h2>
+                                    <p>Asignada a: <strong>{asignado_a}</strong></p>
+                                </div>
+                            """, unsafe_allow_html=True)
+                            st.link_button("📲 Enviar WhatsApp al Técnico", f"https://wa.me/?text={texto_enc}")
+            formulario_orden()
+
+        with tab_planes:
+            @fragmento
+            def nuevo_plan():
+                with st.expander("➕ Nuevo plan"):
+                    c1, c2 = st.columns(2)
+                    nombre_plan = c1.text_input("Nombre del plan", key="plan_nombre")
+                    criticidad_plan = c2.select_slider("Criticidad", CRITICIDADES, value="Media", key="plan_criticidad")
+                    tarea = st.text_area("Tarea a realizar", key="plan_tarea")
+
+                    datos = {"activo_id": None, "categoria": None, "vigente": True}
+                    alcance = st.radio("Aplica a", ["Una categoría", "Un equipo"], horizontal=True, key="plan_alcance")
+                    if alcance == "Un equipo":
+                        activo = selector_busqueda("Equipo", "activos", ("nombre", "ubicacion"), lambda r: f"{r['nombre']} - {r['ubicacion']}",
+                                                   key="plan_equipo", vacio="No hay activos registrados.")
+                        datos["activo_id"] = int(activo['id']) if activo is not None else None
+                    else:
+                        datos["categoria"] = st.selectbox("Categoría", CATEGORIAS, key="plan_categoria")
+                    especialidad = st.selectbox("Especialidad del técnico", ["Según la categoría del equipo"] + ESPECIALIDADES, key="plan_especialidad")
+
+                    c1, c2, c3 = st.columns(3)
+                    tipo = c1.radio("Programación", ["Cada N días", "Calendario"], key="plan_tipo")
+                    if tipo == "Cada N días":
+                        datos.update(tipo="intervalo", cada_dias=int(c2.number_input("Cada (días)", min_value=1, value=30, key="plan_cada")))
+                    else:
+                        frecuencia = c2.selectbox("Frecuencia", ["semanal", "mensual", "anual"], key="plan_frecuencia")
+                        if frecuencia == "semanal":
+                            dia = c3.selectbox("Día", range(1, 8), format_func=lambda d: DIAS_SEMANA[d - 1], key="plan_dia_semana")
+                        else:
+                            dia = c3.number_input("Día del mes", min_value=1, max_value=28, value=1, key="plan_dia_mes")
+                        if frecuencia == "anual":
+                            datos["mes"] = c3.selectbox("Mes", range(1, 13), key="plan_mes")
+                        datos.update(tipo="calendario", frecuencia=frecuencia, dia=int(dia))
+                    primera = st.date_input("Fecha de la primera OT", value=datetime.now().date(), format="DD/MM/YYYY", key="plan_primera")
+
+                    completo = nombre_plan and tarea and (alcance == "Una categoría" or datos.get("activo_id"))
+                    if st.button("Guardar Plan", disabled=not completo):
+                        datos.update(
+                            nombre=nombre_plan, descripcion=tarea, criticidad=criticidad_plan, proxima_fecha=primera.isoformat(),
+                            especialidad=especialidad if especialidad in ESPECIALIDADES else None,
+                        )
+                        try:
+                            supabase.table("planes_preventivos").insert(datos).execute()
+                        except Exception as e:
+                            st.error(f"Error al guardar el plan (¿se ejecutó sql/07_preventivo.sql?): {e}")
+                        else:
+                            invalidar_cache("planes_preventivos")
+                            st.success("Plan creado.")
+                            st.rerun()
+            nuevo_plan()
+
+            @fragmento
+            def lista_planes():
+                df_planes = run_query("planes_preventivos")
+                if df_planes.empty:
+                    st.info("No hay planes registrados.")
+                    return
+                planes = {plan['id']: plan for plan in df_planes.to_dict("records")}
+                st.dataframe(pd.DataFrame({
+                    "Plan": df_planes['nombre'],
+                    "Aplica a": df_planes['categoria'].astype(object).fillna("Equipo #" + df_planes['activo_id'].astype(str)),
+                    "Programación": [describir_programacion(plan) for plan in planes.values()],
+                    "Próxima OT": df_planes['proxima_fecha'].dt.date,
+                    "Vigente": df_planes['vigente'],
+                }), hide_index=True, use_container_width=True)
+                st.caption("Las OTs de los planes vencidos las crea la tarea programada `python preventivo.py`, fuera de la app.")
+
+                c1, c2, c3 = st.columns([2, 1, 1])
+                id_plan = c1.selectbox("Plan", list(planes), format_func=lambda i: planes[i]['nombre'], key="plan_elegido", label_visibility="collapsed")
+                vigente = bool(planes[id_plan]['vigente'])
+                if c2.button("⏸️ Pausar" if vigente else "▶️ Reactivar", use_container_width=True):
+                    cambios = {"vigente": not vigente}
+                    if not vigente:
+                        # Reactivado, el plan sigue desde hoy: las fechas de la pausa no generan OTs
+                        cambios["proxima_fecha"] = proxima_desde(planes[id_plan], date.today()).isoformat()
+                    supabase.table("planes_preventivos").update(cambios).eq("id", int(id_plan)).execute()
+                    invalidar_cache("planes_preventivos")
+                    st.rerun()
+                if c3.button("🗑️ Eliminar", use_container_width=True):
+                    supabase.table("planes_preventivos").delete().eq("id", int(id_plan)).execute()
+                    invalidar_cache("planes_preventivos")
+                    st.rerun()
+            lista_planes()
 
     # 4. USUARIOS (CRUD COMPLETO CON VALIDACIÓN)
     elif choice == "Usuarios":
@@ -297,8 +859,6 @@ else:
             
             del st.session_state['user_msg']
 
-        df_usuarios = run_query("usuarios")
-
         # --- NAVEGACIÓN ---
         selected_sub_tab = option_menu(
             menu_title=None,
@@ -310,150 +870,217 @@ else:
         
         # --- VISTA 1: CREAR ---
         if selected_sub_tab == "Nuevo Usuario":
-            st.write("#### Paso 1: Definir Perfil")
-            if 'reset_key' not in st.session_state: st.session_state.reset_key = 0
+            @fragmento
+            def nuevo_usuario():
+                st.write("#### Paso 1: Definir Perfil")
+                if 'reset_key' not in st.session_state: st.session_state.reset_key = 0
             
-            rol_u = st.selectbox("Seleccione el Rol", ["", "Admin", "Programador", "Tecnico"], key=f"rol_{st.session_state.reset_key}")
+                rol_u = st.selectbox("Seleccione el Rol", [""] + ROLES, key=f"rol_{st.session_state.reset_key}")
             
-            especialidad_selec = "Gestión/Admin"
-            if rol_u == "Tecnico":
-                especialidad_selec = st.selectbox("Especialidad Técnica", ["", "Técnico Infraestructura", "Tecnico Soldadura", "Tecnico Electricista", "Tecnico Aire Acondicionado", "Otros"], key=f"esp_{st.session_state.reset_key}")
+                especialidad_selec = "Gestión/Admin"
+                if rol_u == "Tecnico":
+                    especialidad_selec = st.selectbox("Especialidad Técnica", [""] + ESPECIALIDADES, key=f"esp_{st.session_state.reset_key}")
             
-            st.write("#### Paso 2: Datos Personales")
-            with st.form("crear_user", clear_on_submit=True):
-                c1, c2 = st.columns(2)
-                nombre_u = c1.text_input("Nombre Completo")
-                documento_u = c2.text_input("Número de Documento (Login)")
-                pass_u = c1.text_input("Contraseña", type="password")
-                email_u = c2.text_input("Email (Opcional)")
+                st.write("#### Paso 2: Datos Personales")
+                with st.form("crear_user", clear_on_submit=True):
+                    c1, c2 = st.columns(2)
+                    nombre_u = c1.text_input("Nombre Completo")
+                    documento_u = c2.text_input("Número de Documento (Login)")
+                    pass_u = c1.text_input("Contraseña", type="password")
+                    email_u = c2.text_input("Email (Opcional)")
                 
-                if st.form_submit_button("Crear Usuario"):
-                    if nombre_u and documento_u and pass_u and rol_u and (rol_u != ""):
-                        if rol_u == "Tecnico" and especialidad_selec == "":
-                            st.warning("Debes seleccionar una especialidad.")
-                        else:
-                            # --- 1. VERIFICAR DUPLICADOS ANTES DE GUARDAR ---
-                            existe = supabase.table("usuarios").select("id").eq("documento", documento_u).execute()
-                            
-                            if existe.data:
-                                # Aquí mostramos el mensaje de error básico que pediste
-                                st.error(f"⛔ El número de documento {documento_u} ya está registrado en el sistema.")
+                    if st.form_submit_button("Crear Usuario"):
+                        if nombre_u and documento_u and pass_u and rol_u and (rol_u != ""):
+                            if rol_u == "Tecnico" and especialidad_selec == "":
+                                st.warning("Debes seleccionar una especialidad.")
                             else:
-                                # --- 2. Si no existe, procedemos a guardar ---
-                                try:
-                                    payload = {
-                                        "documento": documento_u, 
-                                        "email": email_u if email_u else None, 
-                                        "password": pass_u, 
-                                        "nombre": nombre_u, 
-                                        "rol": rol_u, 
-                                        "especialidad": especialidad_selec
-                                    }
-                                    supabase.table("usuarios").insert(payload).execute()
+                                # --- 1. VERIFICAR DUPLICADOS ANTES DE GUARDAR ---
+                                existe = supabase.table("usuarios").select("id").eq("documento", documento_u).execute()
+                            
+                                if existe.data:
+                                    # Aquí mostramos el mensaje de error básico que pediste
+                                    st.error(f"⛔ El número de documento {documento_u} ya está registrado en el sistema.")
+                                else:
+                                    # --- 2. Si no existe, procedemos a guardar ---
+                                    try:
+                                        payload = {
+                                            "documento": documento_u, 
+                                            "email": email_u if email_u else None, 
+                                            "password": pass_u, 
+                                            "nombre": nombre_u, 
+                                            "rol": rol_u, 
+                                            "especialidad": especialidad_selec
+                                        }
+                                        supabase.table("usuarios").insert(payload).execute()
+                                        invalidar_cache("usuarios")
                                     
-                                    st.session_state['user_msg'] = {'tipo': 'create', 'nombre': nombre_u, 'rol': rol_u, 'documento': documento_u}
-                                    st.session_state.reset_key += 1
-                                    st.session_state['tab_index_usuarios'] = 0
-                                    st.rerun()
-                                except Exception as e:
-                                    st.error(f"Error al crear: {e}")
-                    else:
-                        st.warning("Completa los campos obligatorios.")
+                                        st.session_state['user_msg'] = {'tipo': 'create', 'nombre': nombre_u, 'rol': rol_u, 'documento': documento_u}
+                                        st.session_state.reset_key += 1
+                                        st.session_state['tab_index_usuarios'] = 0
+                                        st.rerun()
+                                    except Exception as e:
+                                        st.error(f"Error al crear: {e}")
+                        else:
+                            st.warning("Completa los campos obligatorios.")
+            nuevo_usuario()
         
         # --- VISTA 2: EDITAR / ELIMINAR ---
         elif selected_sub_tab == "Editar / Eliminar":
             st.session_state['tab_index_usuarios'] = 1 
             
-            if not df_usuarios.empty:
-                user_map = {f"{row['nombre']} - Doc: {row['documento']}": row['id'] for i, row in df_usuarios.iterrows()}
-                seleccion_user = st.selectbox("🔍 Buscar Usuario", list(user_map.keys()))
+            @fragmento
+            def editar_usuario():
+                data_edit = selector_busqueda(
+                    "Buscar Usuario", "usuarios", ("nombre", "documento"),
+                    lambda r: f"{r['nombre']} - Doc: {r['documento']}", key="buscar_usuario", vacio="No hay usuarios registrados."
+                )
+                if data_edit is not None:
+                    id_user_edit = data_edit['id']
+                    try:
+                        privados = datos_privados_usuario(id_user_edit)
+                    except Exception as e:
+                        st.error(f"No se pudieron leer los datos del usuario: {e}")
+                        return
                 
-                id_user_edit = user_map[seleccion_user]
-                data_edit = df_usuarios[df_usuarios['id'] == id_user_edit].iloc[0]
+                    st.markdown("---")
+                    st.write(f"### Editando a: **{data_edit['nombre']}**")
                 
-                st.markdown("---")
-                st.write(f"### Editando a: **{data_edit['nombre']}**")
-                
-                suffix = id_user_edit 
+                    suffix = id_user_edit 
 
-                new_rol = st.selectbox("Rol", ["Admin", "Programador", "Tecnico"], index=["Admin", "Programador", "Tecnico"].index(data_edit['rol']), key=f"edit_rol_{suffix}")
+                    new_rol = st.selectbox("Rol", ROLES, index=ROLES.index(data_edit['rol']), key=f"edit_rol_{suffix}")
                 
-                new_esp = "Gestión/Admin"
-                if new_rol == "Tecnico":
-                    opciones_esp = ["Técnico Infraestructura", "Tecnico Soldadura", "Tecnico Electricista", "Tecnico Aire Acondicionado", "Otros"]
-                    idx_esp = 0
-                    if data_edit['especialidad'] in opciones_esp: idx_esp = opciones_esp.index(data_edit['especialidad'])
-                    new_esp = st.selectbox("Especialidad", opciones_esp, index=idx_esp, key=f"edit_esp_{suffix}")
-
-                with st.form("editar_usuario_form"):
-                    c1, c2 = st.columns(2)
-                    new_nombre = c1.text_input("Nombre", value=data_edit['nombre'], key=f"edit_nom_{suffix}")
-                    new_documento = c2.text_input("Número de Documento", value=data_edit['documento'], key=f"edit_doc_{suffix}")
-                    new_pass = st.text_input("Contraseña", value=data_edit['password'], type="password", key=f"edit_pass_{suffix}")
-                    new_email = st.text_input("Email (Opcional)", value=data_edit.get('email', '') or '', key=f"edit_mail_{suffix}")
+                    new_esp = "Gestión/Admin"
+                    if new_rol == "Tecnico":
+                        opciones_esp = ESPECIALIDADES
+                        idx_esp = 0
+                        if data_edit['especialidad'] in opciones_esp: idx_esp = opciones_esp.index(data_edit['especialidad'])
+                        new_esp = st.selectbox("Especialidad", opciones_esp, index=idx_esp, key=f"edit_esp_{suffix}")
+
+                    with st.form("editar_usuario_form"):
+                        c1, c2 = st.columns(2)
+                        new_nombre = c1.text_input("Nombre", value=data_edit['nombre'], key=f"edit_nom_{suffix}")
+                        new_documento = c2.text_input("Número de Documento", value=data_edit['documento'], key=f"edit_doc_{suffix}")
+                        new_pass = st.text_input("Contraseña", value=privados.get('password', ''), type="password", key=f"edit_pass_{suffix}")
+                        new_email = st.text_input("Email (Opcional)", value=privados.get('email', '') or '', key=f"edit_mail_{suffix}")
                     
-                    if st.form_submit_button("💾 Guardar Cambios"):
-                        try:
-                            supabase.table("usuarios").update({
-                                "nombre": new_nombre, 
-                                "documento": new_documento, 
-                                "email": new_email if new_email else None, 
-                                "password": new_pass, 
-                                "rol": new_rol, 
-                                "especialidad": new_esp
-                            }).eq("id", int(id_user_edit)).execute()
-                            
-                            st.session_state['user_msg'] = {'tipo': 'update', 'nombre': new_nombre}
-                            st.session_state['tab_index_usuarios'] = 1
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Error al actualizar: {e}")
-                
-                st.markdown("---")
-                with st.expander("🗑️ Zona de Peligro (Eliminar Usuario)"):
-                    if data_edit['documento'] == st.session_state['doc_sesion']:
-                        st.error("⛔ No puedes eliminar tu propio usuario.")
-                    else:
-                        if st.button("Sí, Eliminar", type="primary"):
+                        if st.form_submit_button("💾 Guardar Cambios"):
                             try:
-                                supabase.table("usuarios").delete().eq("id", int(id_user_edit)).execute()
-                                st.session_state['user_msg'] = {'tipo': 'delete', 'nombre': data_edit['nombre']}
+                                supabase.table("usuarios").update({
+                                    "nombre": new_nombre, 
+                                    "documento": new_documento, 
+                                    "email": new_email if new_email else None, 
+                                    "password": new_pass, 
+                                    "rol": new_rol, 
+                                    "especialidad": new_esp
+                                }).eq("id", int(id_user_edit)).execute()
+                                invalidar_cache("usuarios")
+                            
+                                st.session_state['user_msg'] = {'tipo': 'update', 'nombre': new_nombre}
                                 st.session_state['tab_index_usuarios'] = 1
                                 st.rerun()
                             except Exception as e:
-                                st.error(f"Error al eliminar: {e}")
-            else:
-                st.info("No hay usuarios registrados.")
+                                st.error(f"Error al actualizar: {e}")
+                
+                    st.markdown("---")
+                    with st.expander("🗑️ Zona de Peligro (Eliminar Usuario)"):
+                        if data_edit['documento'] == st.session_state['doc_sesion']:
+                            st.error("⛔ No puedes eliminar tu propio usuario.")
+                        else:
+                            if st.button("Sí, Eliminar", type="primary"):
+                                try:
+                                    supabase.table("usuarios").delete().eq("id", int(id_user_edit)).execute()
+                                    invalidar_cache("usuarios")
+                                    st.session_state['user_msg'] = {'tipo': 'delete', 'nombre': data_edit['nombre']}
+                                    st.session_state['tab_index_usuarios'] = 1
+                                    st.rerun()
+                                except Exception as e:
+                                    st.error(f"Error al eliminar: {e}")
             
-            st.markdown("---")
-            st.write("#### 📋 Listado Completo")
-            if not df_usuarios.empty:
-                st.dataframe(df_usuarios[['documento', 'nombre', 'rol', 'especialidad']], use_container_width=True)
+                st.markdown("---")
+                st.write("#### 📋 Listado Completo")
+                df_usuarios = run_query("usuarios", COLUMNAS_USUARIOS)
+                if not df_usuarios.empty:
+                    st.dataframe(df_usuarios[['documento', 'nombre', 'rol', 'especialidad']], use_container_width=True)
+            editar_usuario()
 
     # 5. CIERRE
     elif choice == "Cierre de OTs":
         st.subheader("Mis Órdenes Pendientes")
-        df_ots = run_query("ordenes")
-        
-        if not df_ots.empty:
-            if rol_actual == "Tecnico":
-                mis_ots = df_ots[(df_ots['tecnico_asignado'] == usuario_actual) & (df_ots['estado'] != 'Concluida')]
+        tecnico_filtro = usuario_actual if rol_actual == "Tecnico" else None
+        vista = selector_en_vivo()
+
+        @fragmento(run_every=INTERVALO_EN_VIVO_SEGUNDOS if vista else None)
+        def ots_pendientes():
+            # Pila con el último id de cada página anterior (paginación por id)
+            if 'cursores_ots' not in st.session_state:
+                st.session_state['cursores_ots'] = [0]
+            cursores = st.session_state['cursores_ots']
+
+            if vista:
+                # En vivo: la página sale de la vista compartida, que solo pide los cambios
+                vista.actualizar()
+                if vista.error:
+                    st.warning(f"No se pudieron traer los últimos cambios: {vista.error}")
+                st.caption(f"🔴 En vivo · actualizado {vista.actualizada_en:%H:%M:%S}")
+                mis_ots, hay_mas = vista.pagina_pendientes(tecnico_filtro, cursores[-1], OTS_POR_PAGINA)
             else:
-                mis_ots = df_ots[df_ots['estado'] != 'Concluida']
-            
+                mis_ots, hay_mas = consultar_ots_pendientes(tecnico_filtro, cursores[-1])
+            if mis_ots.empty and len(cursores) > 1:
+                # La página quedó vacía (p. ej. tras cerrar su última OT): volver a la anterior
+                cursores.pop()
+                st.rerun()
+
+            # Las cerradas que siguen en la cola local ya no se muestran como pendientes
+            en_cola = cola_cierres().ots_en_cola()
+            if en_cola and not mis_ots.empty:
+                mis_ots = mis_ots[~mis_ots['id'].isin(en_cola)]
+
             if not mis_ots.empty:
                 st.dataframe(mis_ots[['id', 'descripcion', 'tecnico_asignado', 'estado']], use_container_width=True)
+                c_ant, c_pag, c_sig = st.columns([1, 2, 1])
+                # Los callbacks mueven el cursor antes de que el fragmento se vuelva a ejecutar
+                c_ant.button("⬅️ Anterior", disabled=len(cursores) == 1, use_container_width=True, on_click=cursores.pop)
+                c_pag.markdown(f"<p style='text-align: center;'>Página {len(cursores)}</p>", unsafe_allow_html=True)
+                c_sig.button("Siguiente ➡️", disabled=not hay_mas, use_container_width=True,
+                             on_click=cursores.append, args=(int(mis_ots['id'].iloc[-1]),))
+
                 ot_id = st.selectbox("Seleccionar OT", mis_ots['id'].values)
                 with st.form("cierre_form"):
                     coments = st.text_area("Informe")
                     foto = st.file_uploader("Evidencia")
                     if st.form_submit_button("Cerrar Orden"):
-                        with st.spinner("Procesando..."):
-                            url = subir_imagen(foto)
-                            supabase.table("ordenes").update({"estado":"Concluida", "evidencia_url": url, "comentarios_cierre": coments}).eq("id", int(ot_id)).execute()
+                        try:
+                            cerrar_orden(ot_id, coments, foto)
                             st.success("Cerrada Correctamente")
                             st.rerun()
+                        except Exception as e:
+                            st.error(f"No se pudo registrar el cierre: {e}")
             else:
                 st.info("No tienes órdenes asignadas pendientes.")
-        else:
-            st.info("Sin registros.")
+        ots_pendientes()
+
+        # --- COLA DE CIERRES ---
+        # Mientras haya cierres por enviar se refresca solo este bloque (lee la cola local, no Supabase)
+        cola = cola_cierres()
+        enviando = cola.profundidad() > 0
+
+        @fragmento(run_every=INTERVALO_COLA_SEGUNDOS if enviando else None)
+        def estado_cola():
+            en_cola = cola.profundidad()
+            if enviando and not en_cola:
+                # Se vació: recarga completa para mostrar las OTs al día y dejar de refrescar
+                st.rerun()
+            if en_cola:
+                st.caption(f"⏳ {en_cola} cierre(s) guardados en este equipo, enviándose en segundo plano...")
+            if cola.ultimo_envio:
+                st.caption(f"✅ Último envío a la base: {cola.ultimo_envio:%H:%M:%S}")
+            con_error = cola.con_error()
+            if con_error:
+                with st.expander(f"⚠️ Cierres esperando reintento ({len(con_error)})"):
+                    st.caption("No se pierden: se reintentan solos hasta que la base los confirme.")
+                    st.dataframe(pd.DataFrame(con_error), use_container_width=True)
+        estado_cola()
+
+# --- 6. CIERRE DE LA MEDICIÓN ---
+# Las ejecuciones interrumpidas por st.rerun() se cierran al inicio de la siguiente
+medicion.finalizar()
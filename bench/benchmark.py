@@ -0,0 +1,257 @@
+"""Benchmark de las pantallas de app.py contra un Supabase en memoria.
+
+Corre la app con streamlit.testing.v1.AppTest sobre bench/supabase_falso.py,
+sin red, con datos sintéticos a varias escalas. Por cada pantalla mide:
+
+- frio_ms / frio_rt: primera ejecución con cachés vacíos (latencia y round trips)
+- caliente_ms / caliente_rt: mediana de las ejecuciones siguientes
+- servidor_ms: tiempo que el stand-in tardó en resolver consultas (no es de la app)
+- memoria_mb: pico de memoria de Python durante la ejecución en frío
+
+Uso:
+    python bench/benchmark.py --escalas 1000 50000 500000 --latencia 0.02
+    python bench/benchmark.py --guardar base.json
+    python bench/benchmark.py --comparar base.json --tolerancia 0.25
+"""
+import argparse
+import json
+import logging
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import streamlit as st  # noqa: E402
+import streamlit_option_menu  # noqa: E402
+import supabase as supabase_pkg  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import analitica  # noqa: E402
+import instrumentacion  # noqa: E402,F401  (configura el logger antes de silenciarlo)
+from catalogos import CATEGORIAS, CRITICIDADES, ESPECIALIDADES  # noqa: E402
+from supabase_falso import ClienteFalso  # noqa: E402
+
+# (pantalla, nombre de usuario, rol)
+PANTALLAS = [
+    ("Dashboard", "Admin Bench", "Admin"),
+    ("Gestión de Activos", "Admin Bench", "Admin"),
+    ("Crear Orden", "Admin Bench", "Admin"),
+    ("Usuarios", "Admin Bench", "Admin"),
+    ("Cierre de OTs", "Tecnico 01", "Tecnico"),
+]
+
+
+def generar_datos(n_ordenes, n_tecnicos=20, semilla=7, con_sql=True):
+    """Tablas sintéticas: n_ordenes órdenes, ~1 activo cada 25 órdenes y n_tecnicos técnicos"""
+    rng = np.random.default_rng(semilla)
+    n_activos = max(50, n_ordenes // 25)
+    inicio = pd.Timestamp("2023-01-01", tz="UTC")
+
+    activos = pd.DataFrame({
+        "id": np.arange(1, n_activos + 1),
+        "nombre": [f"Equipo {i:06d}" for i in range(1, n_activos + 1)],
+        "ubicacion": [f"Planta {i % 12} - Zona {i % 7}" for i in range(1, n_activos + 1)],
+        "categoria": rng.choice(CATEGORIAS, n_activos),
+    })
+
+    tecnicos = [f"Tecnico {i:02d}" for i in range(1, n_tecnicos + 1)]
+    usuarios = [{"id": 1, "documento": "1000", "password": "bench", "nombre": "Admin Bench", "rol": "Admin",
+                 "especialidad": "Gestión/Admin", "email": None}]
+    usuarios += [{"id": i + 2, "documento": str(2000 + i), "password": "bench", "nombre": nombre, "rol": "Tecnico",
+                  "especialidad": ESPECIALIDADES[i % len(ESPECIALIDADES)], "email": None}
+                 for i, nombre in enumerate(tecnicos)]
+
+    # Histórico de 3 años: la gran mayoría concluidas, como en una planta real
+    fechas = inicio + pd.to_timedelta(np.sort(rng.integers(0, 3 * 365 * 24 * 3600, n_ordenes)), unit="s")
+    estados = np.where(rng.random(n_ordenes) < 0.9, "Concluida", "Abierta")
+    # Reparaciones de 1 hora a ~2 semanas
+    horas_reparacion = pd.to_timedelta(rng.exponential(48, n_ordenes).clip(1, 14 * 24), unit="h")
+    cierres = (fechas + horas_reparacion).floor("s").strftime("%Y-%m-%dT%H:%M:%S+00:00")
+    ordenes = pd.DataFrame({
+        "id": np.arange(1, n_ordenes + 1),
+        "activo_id": rng.integers(1, n_activos + 1, n_ordenes),
+        "descripcion": [f"Falla reportada #{i}" for i in range(1, n_ordenes + 1)],
+        "criticidad": rng.choice(CRITICIDADES, n_ordenes),
+        "estado": estados,
+        "fecha_creacion": fechas.strftime("%Y-%m-%dT%H:%M:%S"),
+        "updated_at": fechas.map(pd.Timestamp.isoformat),
+        "tecnico_asignado": rng.choice(tecnicos, n_ordenes),
+        "comentarios_cierre": np.where(estados == "Concluida", "Trabajo realizado", None),
+        "evidencia_url": None,
+        "fecha_cierre": np.where(estados == "Concluida", cierres, None),
+    })
+
+    if not con_sql:
+        ordenes = ordenes.drop(columns="fecha_cierre")
+
+    tablas = {
+        "activos": activos.to_dict("records"),
+        "usuarios": usuarios,
+        "ordenes": ordenes.to_dict("records"),
+        "auditoria_eliminados": [],
+    }
+    for fila in tablas["activos"] + tablas["usuarios"]:
+        fila["id"] = int(fila["id"])
+        fila["updated_at"] = inicio.isoformat()
+    for fila in tablas["ordenes"]:
+        fila["id"] = int(fila["id"])
+        fila["activo_id"] = int(fila["activo_id"])
+        # Las columnas de texto de pandas usan NaN como vacío; en Supabase es null
+        for columna in ("comentarios_cierre", "fecha_cierre"):
+            if columna in fila and pd.isna(fila[columna]):
+                fila[columna] = None
+
+    if con_sql:
+        resumen = ordenes.groupby(["estado", "criticidad"]).size().reset_index(name="total")
+        resumen.insert(0, "id", range(1, len(resumen) + 1))
+        tablas["resumen_ordenes"] = resumen.astype({"total": int}).to_dict("records")
+        tablas["registro_eliminaciones"] = []
+        # Resúmenes de sql/06, con la misma cuenta que hace la app sin ellos
+        rollups = analitica.rollups_desde_ordenes(ordenes, activos)
+        for nombre in ("semanal", "tecnicos", "activos"):
+            df = rollups[nombre].copy()
+            for columna in ("semana", "ultima_falla"):
+                if columna in df:
+                    df[columna] = df[columna].dt.strftime("%Y-%m-%d" if columna == "semana" else "%Y-%m-%dT%H:%M:%S+00:00")
+            df.insert(0, "id", range(1, len(df) + 1))
+            tablas[f"analitica_{nombre}"] = df.astype({"activo_id": int} if nombre == "activos" else {}).to_dict("records")
+        for fila in tablas["analitica_activos"]:
+            # mttr_horas es una columna generada: null si no hay cerradas
+            if pd.isna(fila["mttr_horas"]):
+                fila["mttr_horas"] = None
+    return tablas
+
+
+def _preparar(cliente, pantalla):
+    """Conecta la app al cliente falso y fija la pantalla del menú lateral"""
+    supabase_pkg.create_client = lambda url, key: cliente
+
+    def option_menu(menu_title, options, default_index=0, **kwargs):
+        if menu_title == "MENÚ PRINCIPAL" and pantalla in options:
+            return pantalla
+        return options[default_index]
+
+    streamlit_option_menu.option_menu = option_menu
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+def _nueva_app(usuario, rol, timeout):
+    at = AppTest.from_file(str(RAIZ / "app.py"), default_timeout=timeout)
+    at.secrets["SUPABASE_URL"] = "https://supabase.falso"
+    at.secrets["SUPABASE_KEY"] = "bench"
+    at.secrets["COLA_CIERRES_RUTA"] = str(Path(tempfile.gettempdir()) / "bench_cola_cierres.db")
+    at.session_state["usuario"] = usuario
+    at.session_state["rol"] = rol
+    at.session_state["doc_sesion"] = "1000"
+    return at
+
+
+def _ejecutar(at, cliente):
+    llamadas, servidor = cliente.llamadas, cliente.tiempo_servidor
+    inicio = time.perf_counter()
+    at.run()
+    ms = (time.perf_counter() - inicio) * 1000
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return ms, cliente.llamadas - llamadas, (cliente.tiempo_servidor - servidor) * 1000
+
+
+def medir_pantalla(tablas, pantalla, usuario, rol, latencia, repeticiones, timeout):
+    # Sin los scripts de sql/ tampoco existen sus funciones
+    funciones = None if "resumen_ordenes" in tablas else {}
+    cliente = ClienteFalso(tablas, latencia=latencia, funciones=funciones)
+    _preparar(cliente, pantalla)
+    at = _nueva_app(usuario, rol, timeout)
+    frio_ms, frio_rt, frio_srv = _ejecutar(at, cliente)
+    calientes = [_ejecutar(at, cliente) for _ in range(repeticiones)]
+
+    # Memoria en una corrida aparte: tracemalloc distorsiona los tiempos
+    cliente = ClienteFalso(tablas, latencia=0, funciones=funciones)
+    _preparar(cliente, pantalla)
+    at = _nueva_app(usuario, rol, timeout)
+    tracemalloc.start()
+    _ejecutar(at, cliente)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "pantalla": pantalla,
+        "frio_ms": round(frio_ms, 1),
+        "frio_rt": frio_rt,
+        "caliente_ms": round(statistics.median(c[0] for c in calientes), 1),
+        "caliente_rt": max(c[1] for c in calientes),
+        "servidor_ms": round(frio_srv, 1),
+        "memoria_mb": round(pico / 2 ** 20, 1),
+    }
+
+
+def comparar(resultados, base, tolerancia):
+    """Lista de regresiones respecto a una corrida guardada"""
+    base = {(r["escala"], r["pantalla"]): r for r in base}
+    regresiones = []
+    for r in resultados:
+        anterior = base.get((r["escala"], r["pantalla"]))
+        if anterior is None:
+            continue
+        for metrica in ("frio_rt", "caliente_rt"):
+            if r[metrica] > anterior[metrica]:
+                regresiones.append(f"{r['pantalla']} @ {r['escala']}: {metrica} {anterior[metrica]} -> {r[metrica]}")
+        for metrica in ("frio_ms", "caliente_ms", "memoria_mb"):
+            if r[metrica] > anterior[metrica] * (1 + tolerancia) and r[metrica] - anterior[metrica] > 5:
+                regresiones.append(f"{r['pantalla']} @ {r['escala']}: {metrica} {anterior[metrica]} -> {r[metrica]}")
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", type=int, nargs="+", default=[1000, 50000, 500000], help="número de órdenes por escenario")
+    parser.add_argument("--pantallas", nargs="+", default=[p[0] for p in PANTALLAS], help="pantallas a medir")
+    parser.add_argument("--latencia", type=float, default=0.02, help="segundos por round trip simulado")
+    parser.add_argument("--repeticiones", type=int, default=3, help="ejecuciones en caliente por pantalla")
+    parser.add_argument("--sin-sql", action="store_true", help="simular una base sin los scripts de sql/")
+    parser.add_argument("--timeout", type=float, default=600, help="timeout de cada ejecución de AppTest (s)")
+    parser.add_argument("--guardar", type=Path, help="guardar los resultados en este JSON")
+    parser.add_argument("--comparar", type=Path, help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="aumento relativo permitido en tiempos y memoria")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("cmms.metricas").setLevel(logging.WARNING)
+    for nombre in list(logging.root.manager.loggerDict):
+        if nombre.startswith("streamlit"):
+            logging.getLogger(nombre).setLevel(logging.ERROR)
+
+    resultados = []
+    for escala in args.escalas:
+        tablas = generar_datos(escala, con_sql=not args.sin_sql)
+        for pantalla, usuario, rol in PANTALLAS:
+            if pantalla not in args.pantallas:
+                continue
+            fila = medir_pantalla(tablas, pantalla, usuario, rol, args.latencia, args.repeticiones, args.timeout)
+            fila["escala"] = escala
+            resultados.append(fila)
+            print(f"{escala:>8} {pantalla:<20} frío {fila['frio_ms']:>9.1f} ms / {fila['frio_rt']:>4} rt   "
+                  f"caliente {fila['caliente_ms']:>8.1f} ms / {fila['caliente_rt']:>3} rt   {fila['memoria_mb']:>7.1f} MB",
+                  flush=True)
+
+    if args.guardar:
+        args.guardar.write_text(json.dumps(resultados, indent=2, ensure_ascii=False))
+    if args.comparar:
+        regresiones = comparar(resultados, json.loads(args.comparar.read_text()), args.tolerancia)
+        for regresion in regresiones:
+            print(f"REGRESIÓN: {regresion}")
+        return 1 if regresiones else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
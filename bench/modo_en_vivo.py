@@ -0,0 +1,94 @@
+"""Prueba del modo en vivo (en_vivo.py) contra el Supabase en memoria.
+
+Simula un turno: en cada ciclo otras sesiones crean, cierran, editan y borran
+órdenes en el stand-in, la vista aplica los deltas y se compara con el estado
+real de la tabla. Reporta los round trips por ciclo frente a los de recargar
+`ordenes` completa, que es lo que hacía refrescar la pantalla a mano.
+
+Uso:
+    python bench/modo_en_vivo.py --ordenes 50000 --ciclos 30
+"""
+import argparse
+import random
+import sys
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from benchmark import generar_datos  # noqa: E402
+from en_vivo import SondeoOrdenes, VistaOrdenes, TAM_PAGINA  # noqa: E402
+from supabase_falso import ClienteFalso  # noqa: E402
+
+
+def simular_cambios(cliente, rng, n):
+    """n escrituras al azar sobre ordenes, como las harían otras sesiones"""
+    ordenes = cliente.tablas["ordenes"]
+    for _ in range(n):
+        accion = rng.random()
+        if accion < 0.4:
+            cliente.table("ordenes").insert({
+                "activo_id": 1, "descripcion": "Nueva falla", "criticidad": rng.choice(["Baja", "Alta"]),
+                "estado": "Abierta", "fecha_creacion": "2026-01-01T00:00:00", "tecnico_asignado": "Tecnico 01",
+            }).execute()
+        elif accion < 0.8:
+            abiertas = [f["id"] for f in ordenes[-2000:] if f["estado"] == "Abierta"]
+            if abiertas:
+                cliente.table("ordenes").update({"estado": "Concluida"}).eq("id", rng.choice(abiertas)).execute()
+        elif accion < 0.9:
+            cliente.table("ordenes").update({"criticidad": "Crítica"}).eq("id", rng.choice(ordenes)["id"]).execute()
+        else:
+            cliente.table("ordenes").delete().eq("id", rng.choice(ordenes)["id"]).execute()
+
+
+def verificar(vista, cliente):
+    """Lista de diferencias entre la vista y la tabla real"""
+    reales = sorted(f["id"] for f in cliente.tablas["ordenes"] if f["estado"] != "Concluida")
+    diferencias = []
+    if vista.pendientes["id"].tolist() != reales:
+        diferencias.append(f"pendientes: vista {len(vista.pendientes)} vs real {len(reales)}")
+    conteo_real = {}
+    for f in cliente.tablas["ordenes"]:
+        conteo_real[(f["estado"], f["criticidad"])] = conteo_real.get((f["estado"], f["criticidad"]), 0) + 1
+    conteo_vista = {(r.estado, r.criticidad): int(r.total) for r in vista.resumen.itertuples() if r.total}
+    if conteo_vista != conteo_real:
+        diferencias.append("conteos por estado/criticidad")
+    return diferencias
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ordenes", type=int, default=50000)
+    parser.add_argument("--ciclos", type=int, default=30)
+    parser.add_argument("--cambios", type=int, default=20, help="escrituras de otras sesiones por ciclo")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(3)
+    cliente = ClienteFalso(generar_datos(args.ordenes))
+    vista = VistaOrdenes(SondeoOrdenes(cliente), intervalo=0)
+
+    antes = cliente.llamadas
+    vista.actualizar()
+    print(f"carga inicial: {cliente.llamadas - antes} round trips, {len(vista.pendientes)} pendientes")
+
+    fallas = 0
+    por_ciclo = []
+    for ciclo in range(args.ciclos):
+        simular_cambios(cliente, rng, args.cambios)
+        antes = cliente.llamadas
+        vista.actualizar()
+        por_ciclo.append(cliente.llamadas - antes)
+        diferencias = verificar(vista, cliente)
+        if diferencias or vista.error:
+            fallas += 1
+            print(f"ciclo {ciclo}: {vista.error or ', '.join(diferencias)}")
+
+    recarga = -(-len(cliente.tablas["ordenes"]) // TAM_PAGINA)
+    print(f"{args.ciclos} ciclos: {max(por_ciclo)} round trips máx. por ciclo (recarga completa: {recarga}), "
+          f"{'OK' if not fallas else f'{fallas} ciclos con diferencias'}")
+    return 1 if fallas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
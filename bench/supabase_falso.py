@@ -0,0 +1,510 @@
+"""Stand-in en memoria del cliente de Supabase para correr la app sin red.
+
+Implementa la parte de la API de supabase-py que usa app.py: table() con
+select/insert/upsert/update/delete y sus filtros, rpc(), storage y las
+respuestas con .data y .count. Reproduce además lo que hacen los scripts de
+sql/ (updated_at, registro_eliminaciones, resumen_ordenes, fecha_cierre y los
+resúmenes de analitica_*, y las funciones dar_de_baja_activos y cerrar_ordenes)
+cuando las tablas correspondientes existen.
+
+Cada petición suma 1 a `llamadas` y espera `latencia` segundos, para simular
+el viaje de ida y vuelta. `tiempo_servidor` acumula lo que tarda el propio
+stand-in en resolver las consultas, para poder descontarlo de las mediciones.
+"""
+import bisect
+import copy
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+
+class Respuesta:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class ErrorFalso(Exception):
+    def __init__(self, mensaje, code=None):
+        super().__init__(mensaje)
+        self.code = code
+
+
+def _ahora():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _comparar(valor, op, objetivo):
+    if op == "eq":
+        return valor == objetivo
+    if op == "neq":
+        return valor != objetivo
+    if op == "is":
+        return valor is None if objetivo in (None, "null") else valor == objetivo
+    if op == "in":
+        return valor in objetivo
+    if valor is None:
+        return False
+    if op == "ilike":
+        return str(objetivo).strip("%*").lower() in str(valor).lower()
+    if op == "gt":
+        return valor > objetivo
+    if op == "gte":
+        return valor >= objetivo
+    if op == "lt":
+        return valor < objetivo
+    if op == "lte":
+        return valor <= objetivo
+    raise ValueError(f"Operador no soportado: {op}")
+
+
+def _valor_or(texto):
+    """Convierte el valor de una condición de or_() (PostgREST) a Python"""
+    if texto.startswith('"') and texto.endswith('"'):
+        return texto[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    for tipo in (int, float):
+        try:
+            return tipo(texto)
+        except ValueError:
+            pass
+    return texto
+
+
+def _id(fila):
+    return fila["id"]
+
+
+class Consulta:
+    """Request builder: acumula acción, filtros y orden hasta execute()"""
+
+    def __init__(self, cliente, tabla):
+        self.cliente = cliente
+        self.tabla = tabla
+        self.accion = "select"
+        self.columnas = "*"
+        self.payload = None
+        self.filtros = []
+        self.orden = []
+        self.limite = None
+        self.desde = 0
+        self.count = None
+        self.head = False
+
+    def select(self, *columnas, count=None, head=None):
+        self.columnas = ",".join(columnas) if columnas else "*"
+        self.count = count
+        self.head = bool(head)
+        return self
+
+    def insert(self, json, **kwargs):
+        self.accion, self.payload = "insert", json
+        return self
+
+    def upsert(self, json, on_conflict="", ignore_duplicates=False, **kwargs):
+        self.accion, self.payload = "upsert", json
+        self.on_conflict, self.ignore_duplicates = on_conflict or "id", ignore_duplicates
+        return self
+
+    def update(self, json, **kwargs):
+        self.accion, self.payload = "update", json
+        return self
+
+    def delete(self, **kwargs):
+        self.accion = "delete"
+        return self
+
+    def _filtro(self, op, columna, valor):
+        self.filtros.append((op, columna, valor))
+        return self
+
+    def eq(self, columna, valor):
+        return self._filtro("eq", columna, valor)
+
+    def neq(self, columna, valor):
+        return self._filtro("neq", columna, valor)
+
+    def gt(self, columna, valor):
+        return self._filtro("gt", columna, valor)
+
+    def gte(self, columna, valor):
+        return self._filtro("gte", columna, valor)
+
+    def lt(self, columna, valor):
+        return self._filtro("lt", columna, valor)
+
+    def lte(self, columna, valor):
+        return self._filtro("lte", columna, valor)
+
+    def in_(self, columna, valores):
+        return self._filtro("in", columna, set(valores))
+
+    def ilike(self, columna, patron):
+        return self._filtro("ilike", columna, patron)
+
+    def is_(self, columna, valor):
+        return self._filtro("is", columna, valor)
+
+    def or_(self, expresion):
+        condiciones = []
+        for parte in expresion.split(","):
+            columna, op, valor = parte.split(".", 2)
+            condiciones.append((op, columna, _valor_or(valor)))
+        self.filtros.append(("or", None, condiciones))
+        return self
+
+    def order(self, columna, desc=False):
+        self.orden.append((columna, desc))
+        return self
+
+    def limit(self, n):
+        self.limite = n
+        return self
+
+    def range(self, inicio, fin):
+        self.desde, self.limite = inicio, fin - inicio + 1
+        return self
+
+    def execute(self):
+        return self.cliente._ejecutar(self)
+
+
+class Bucket:
+    def __init__(self, cliente, nombre):
+        self.cliente = cliente
+        self.nombre = nombre
+
+    def upload(self, path, file, file_options=None):
+        self.cliente._viaje()
+        objetos = self.cliente.objetos.setdefault(self.nombre, {})
+        if path in objetos:
+            raise ErrorFalso("The resource already exists (Duplicate)", code="409")
+        objetos[path] = bytes(file)
+        return {"Key": f"{self.nombre}/{path}"}
+
+    def exists(self, path):
+        self.cliente._viaje()
+        return path in self.cliente.objetos.get(self.nombre, {})
+
+    def get_public_url(self, path, options=None):
+        return f"https://supabase.falso/storage/v1/object/public/{self.nombre}/{path}"
+
+
+class Storage:
+    def __init__(self, cliente):
+        self.cliente = cliente
+
+    def from_(self, bucket):
+        return Bucket(self.cliente, bucket)
+
+
+class LlamadaRPC:
+    def __init__(self, cliente, nombre, params):
+        self.cliente = cliente
+        self.nombre = nombre
+        self.params = params or {}
+
+    def execute(self):
+        self.cliente._viaje()
+        funcion = self.cliente.funciones.get(self.nombre)
+        if funcion is None:
+            raise ErrorFalso(f"Could not find the function public.{self.nombre}", code="PGRST202")
+        inicio = time.perf_counter()
+        with self.cliente.lock:
+            try:
+                return Respuesta(funcion(self.cliente, **self.params))
+            finally:
+                self.cliente.tiempo_servidor += time.perf_counter() - inicio
+
+
+def dar_de_baja_activos(cliente, p_ids, p_motivo, p_usuario):
+    """Equivalente de sql/04_baja_activos.sql"""
+    ids = set(p_ids)
+    activos = [a for a in cliente.tablas["activos"] if a["id"] in ids]
+    cliente._insertar("auditoria_eliminados", [{
+        "tipo_registro": "Activo",
+        "nombre_referencia": a["nombre"],
+        "datos_respaldo": {"id_original": a["id"], "nombre": a["nombre"], "ubicacion": a["ubicacion"],
+                           "categoria": a["categoria"], "motivo_baja": p_motivo},
+        "usuario_responsable": p_usuario,
+    } for a in activos])
+    cliente._eliminar("ordenes", [o for o in cliente.tablas["ordenes"] if o.get("activo_id") in ids])
+    cliente._eliminar("activos", activos)
+    return len(activos)
+
+
+def cerrar_ordenes(cliente, p_cierres):
+    """Equivalente de sql/05_cierre_ordenes.sql"""
+    aplicados = cliente.tablas.setdefault("cierres_aplicados", [])
+    vistas = {a["clave"] for a in aplicados}
+    for c in p_cierres:
+        if c["clave"] in vistas:
+            continue
+        cliente._insertar("cierres_aplicados", [{"clave": c["clave"], "orden_id": c["ot_id"]}])
+        vistas.add(c["clave"])
+        datos = {"estado": "Concluida", "comentarios_cierre": c["comentarios"]}
+        if c.get("evidencia_url"):
+            datos["evidencia_url"] = c["evidencia_url"]
+        if "analitica_semanal" in cliente.tablas:
+            # sql/06: la hora de cierre es la que registró la app
+            datos["fecha_cierre"] = c.get("fecha_cierre") or _ahora()
+        for orden in cliente.tablas["ordenes"]:
+            if orden["id"] == c["ot_id"]:
+                antes = dict(orden)
+                orden.update(datos)
+                cliente._al_actualizar("ordenes", antes, orden)
+    return [c["clave"] for c in p_cierres]
+
+
+class ClienteFalso:
+    """Cliente con tablas en memoria: {nombre_tabla: [filas]}. `esquema` ({tabla: columnas})
+    declara las columnas de tablas que arrancan vacías."""
+
+    def __init__(self, tablas=None, latencia=0.0, funciones=None, esquema=None):
+        self.tablas = {nombre: sorted((dict(f) for f in filas), key=_id) for nombre, filas in (tablas or {}).items()}
+        self.latencia = latencia
+        if funciones is None:
+            funciones = {"dar_de_baja_activos": dar_de_baja_activos, "cerrar_ordenes": cerrar_ordenes}
+        self.funciones = dict(funciones)
+        self.objetos = {}
+        self.storage = Storage(self)
+        self.lock = threading.RLock()
+        self.llamadas = 0
+        self.tiempo_servidor = 0.0
+        self._indices = {}
+        # Columnas de cada tabla, para rechazar como PostgREST las que no existen
+        self._columnas = {nombre: set().union(*filas) if filas else set() for nombre, filas in self.tablas.items()}
+        for nombre, columnas in (esquema or {}).items():
+            self._columnas.setdefault(nombre, set()).update(columnas)
+        self._siguiente_id = {nombre: (filas[-1]["id"] + 1 if filas else 1) for nombre, filas in self.tablas.items()}
+
+    # --- API de supabase-py ---
+    def table(self, nombre):
+        return Consulta(self, nombre)
+
+    def from_(self, nombre):
+        return Consulta(self, nombre)
+
+    def rpc(self, nombre, params=None, **kwargs):
+        return LlamadaRPC(self, nombre, params)
+
+    # --- internos ---
+    def _viaje(self):
+        with self.lock:
+            self.llamadas += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def _ejecutar(self, consulta):
+        self._viaje()
+        inicio = time.perf_counter()
+        with self.lock:
+            try:
+                return self._resolver(consulta)
+            finally:
+                self.tiempo_servidor += time.perf_counter() - inicio
+
+    def _resolver(self, q):
+        if q.tabla not in self.tablas:
+            raise ErrorFalso(f'relation "public.{q.tabla}" does not exist', code="42P01")
+        if q.accion in ("insert", "upsert"):
+            filas = q.payload if isinstance(q.payload, list) else [q.payload]
+            if q.accion == "upsert":
+                return Respuesta(self._upsert(q.tabla, filas, q.on_conflict.split(","), q.ignore_duplicates))
+            return Respuesta(self._insertar(q.tabla, filas))
+
+        coinciden = self._filtrar(q)
+        if q.accion == "update":
+            for fila in coinciden:
+                antes = dict(fila)
+                fila.update(q.payload)
+                self._al_actualizar(q.tabla, antes, fila)
+            return Respuesta([dict(f) for f in coinciden])
+        if q.accion == "delete":
+            self._eliminar(q.tabla, coinciden)
+            return Respuesta([dict(f) for f in coinciden])
+
+        total = len(coinciden) if q.count else None
+        for columna, desc in reversed(q.orden):
+            if columna != "id" or desc:
+                coinciden.sort(key=lambda f: (f.get(columna) is None, f.get(columna)), reverse=desc)
+        coinciden = coinciden[q.desde:]
+        if q.limite is not None:
+            coinciden = coinciden[:q.limite]
+        if q.head:
+            return Respuesta([], total)
+        columnas = [c.strip() for c in q.columnas.split(",")]
+        faltantes = [c for c in columnas if c != "*" and self._columnas[q.tabla] and c not in self._columnas[q.tabla]]
+        if faltantes:
+            raise ErrorFalso(f"column {q.tabla}.{faltantes[0]} does not exist", code="42703")
+        if columnas == ["*"]:
+            return Respuesta([copy.copy(f) for f in coinciden], total)
+        return Respuesta([{c: f.get(c) for c in columnas} for f in coinciden], total)
+
+    def _filtrar(self, q):
+        filas = self.tablas[q.tabla]
+        inicio, fin = 0, len(filas)
+        # Las tablas están ordenadas por id: los filtros sobre id acotan el rango con bisect
+        for op, columna, valor in q.filtros:
+            if columna != "id":
+                continue
+            if op in ("gt", "gte"):
+                corte = (bisect.bisect_right if op == "gt" else bisect.bisect_left)(filas, valor, key=_id)
+                inicio = max(inicio, corte)
+            elif op in ("lt", "lte"):
+                corte = (bisect.bisect_left if op == "lt" else bisect.bisect_right)(filas, valor, key=_id)
+                fin = min(fin, corte)
+            elif op == "eq":
+                inicio = max(inicio, bisect.bisect_left(filas, valor, key=_id))
+                fin = min(fin, bisect.bisect_right(filas, valor, key=_id))
+
+        # Sin orden distinto de id ni conteo, se puede cortar apenas se llena la página
+        solo_por_id = all(c == "id" and not d for c, d in q.orden)
+        tope = q.desde + q.limite if (q.limite is not None and solo_por_id and not q.count and q.accion == "select") else None
+
+        resultado = []
+        for i in range(inicio, fin):
+            fila = filas[i]
+            if all(self._cumple(fila, filtro) for filtro in q.filtros):
+                resultado.append(fila)
+                if tope is not None and len(resultado) >= tope:
+                    break
+        return resultado
+
+    @staticmethod
+    def _cumple(fila, filtro):
+        op, columna, valor = filtro
+        if op == "or":
+            return any(_comparar(fila.get(c), o, v) for o, c, v in valor)
+        return _comparar(fila.get(columna), op, valor)
+
+    def _insertar(self, tabla, filas):
+        creadas = []
+        for fila in filas:
+            fila = dict(fila)
+            if "id" not in fila:
+                fila["id"] = self._siguiente_id.get(tabla, 1)
+            self._siguiente_id[tabla] = max(self._siguiente_id.get(tabla, 1), fila["id"] + 1)
+            if tabla in ("ordenes", "activos", "usuarios"):
+                fila["updated_at"] = _ahora()
+            self._columnas.setdefault(tabla, set()).update(fila)
+            destino = self.tablas[tabla]
+            if destino and destino[-1]["id"] > fila["id"]:
+                bisect.insort(destino, fila, key=_id)
+            else:
+                destino.append(fila)
+            self._al_actualizar(tabla, None, fila)
+            creadas.append(dict(fila))
+        return creadas
+
+    def _upsert(self, tabla, filas, clave, ignorar):
+        """insert ... on conflict (clave) do nothing / do update. Con algún null en la clave no hay conflicto"""
+        existentes = {tuple(f.get(c) for c in clave): f for f in self.tablas[tabla]}
+        resultado = []
+        for fila in filas:
+            valor = tuple(fila.get(c) for c in clave)
+            existente = existentes.get(valor) if None not in valor else None
+            if existente is None:
+                nueva = self._insertar(tabla, [fila])
+                destino = self.tablas[tabla]
+                existentes[valor] = destino[bisect.bisect_left(destino, nueva[0]["id"], key=_id)]
+                resultado.extend(nueva)
+            elif not ignorar:
+                antes = dict(existente)
+                existente.update(fila)
+                self._al_actualizar(tabla, antes, existente)
+                resultado.append(dict(existente))
+        return resultado
+
+    def _eliminar(self, tabla, filas):
+        ids = {f["id"] for f in filas}
+        self.tablas[tabla] = [f for f in self.tablas[tabla] if f["id"] not in ids]
+        if tabla == "planes_preventivos":
+            # sql/07: ordenes.plan_id ... on delete set null
+            for orden in self.tablas["ordenes"]:
+                if orden.get("plan_id") in ids:
+                    antes = dict(orden)
+                    orden["plan_id"] = None
+                    self._al_actualizar("ordenes", antes, orden)
+        for fila in filas:
+            self._al_actualizar(tabla, fila, None)
+            if "registro_eliminaciones" in self.tablas and tabla in ("ordenes", "activos", "usuarios"):
+                self._insertar("registro_eliminaciones", [{"tabla": tabla, "registro_id": fila["id"], "eliminado_en": _ahora()}])
+
+    def _al_actualizar(self, tabla, antes, despues):
+        """Triggers de sql/: updated_at, fecha_cierre, resumen_ordenes y analitica_*"""
+        if despues is not None and antes is not None and tabla in ("ordenes", "activos", "usuarios"):
+            despues["updated_at"] = _ahora()
+        if tabla != "ordenes":
+            return
+        if "analitica_semanal" in self.tablas:
+            if despues is not None:
+                if despues.get("estado") != "Concluida":
+                    despues["fecha_cierre"] = None
+                elif antes is not None and antes.get("estado") != "Concluida" and not despues.get("fecha_cierre"):
+                    despues["fecha_cierre"] = _ahora()
+            self._actualizar_analitica(antes, -1)
+            self._actualizar_analitica(despues, 1)
+        if "resumen_ordenes" not in self.tablas:
+            return
+        resumen = self.tablas["resumen_ordenes"]
+        for fila, signo in ((antes, -1), (despues, 1)):
+            if fila is None:
+                continue
+            clave = (fila.get("estado") or "", fila.get("criticidad") or "")
+            for r in resumen:
+                if (r["estado"], r["criticidad"]) == clave:
+                    r["total"] += signo
+                    break
+            else:
+                resumen.append({"id": len(resumen) + 1, "estado": clave[0], "criticidad": clave[1], "total": signo})
+
+    def _sumar(self, tabla, clave, valores):
+        """upsert que suma `valores` a la fila con la clave dada"""
+        indice = self._indices.setdefault(tabla, {})
+        if not indice and self.tablas[tabla]:
+            indice.update({tuple(f[c] for c in clave): f for f in self.tablas[tabla]})
+        fila = indice.get(tuple(clave.values()))
+        if fila is None:
+            self._insertar(tabla, [{**clave, **{c: 0 for c in valores}}])
+            fila = indice[tuple(clave.values())] = self.tablas[tabla][-1]
+        for columna, valor in valores.items():
+            fila[columna] = fila[columna] + valor
+        return fila
+
+    def _actualizar_analitica(self, orden, signo):
+        """Equivalente de aplicar_analitica() en sql/06_analitica.sql"""
+        if orden is None:
+            return
+        activos = self.tablas.get("activos", [])
+        i = bisect.bisect_left(activos, orden.get("activo_id") or 0, key=_id)
+        categoria = activos[i].get("categoria") or "" if i < len(activos) and activos[i]["id"] == orden.get("activo_id") else ""
+        tecnico = orden.get("tecnico_asignado") or ""
+        creada = datetime.fromisoformat(orden["fecha_creacion"])
+        if creada.tzinfo is None:
+            creada = creada.replace(tzinfo=timezone.utc)
+        cerrada = orden.get("estado") == "Concluida"
+        reparada = cerrada and bool(orden.get("fecha_cierre"))
+        # Sin fecha de cierre cuenta como cerrada en su semana de creación y fuera del MTTR
+        cierre = datetime.fromisoformat(orden["fecha_cierre"]) if reparada else creada
+        horas = max((cierre - creada).total_seconds() / 3600, 0) if reparada else 0
+
+        def semana(fecha):
+            fecha = fecha.astimezone(timezone.utc)
+            return (fecha - timedelta(days=fecha.weekday())).strftime("%Y-%m-%d")
+
+        self._sumar("analitica_semanal", {"semana": semana(creada), "categoria": categoria}, {"creadas": signo})
+        self._sumar("analitica_tecnicos", {"semana": semana(creada), "tecnico": tecnico}, {"asignadas": signo})
+        if cerrada:
+            self._sumar("analitica_semanal", {"semana": semana(cierre), "categoria": categoria},
+                        {"cerradas": signo, "reparaciones": signo * reparada, "horas_reparacion": signo * horas})
+            self._sumar("analitica_tecnicos", {"semana": semana(cierre), "tecnico": tecnico}, {"cerradas": signo})
+        if orden.get("activo_id") is not None and not orden.get("preventiva"):
+            # sql/07: las preventivas no cuentan como fallas del activo
+            fila = self._sumar("analitica_activos", {"activo_id": orden["activo_id"]},
+                               {"fallas": signo, "cerradas": signo * cerrada, "reparaciones": signo * reparada,
+                                "horas_reparacion": signo * horas})
+            if signo > 0:
+                ultima = creada.isoformat()
+                fila["ultima_falla"] = max(fila.get("ultima_falla") or ultima, ultima)
+            # Columna generada en la base
+            fila["mttr_horas"] = fila["horas_reparacion"] / fila["reparaciones"] if fila["reparaciones"] else None
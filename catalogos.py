@@ -0,0 +1,7 @@
+"""Valores permitidos en los campos de selección de la app."""
+
+CATEGORIAS = ["Mecánico", "Eléctrico", "Infraestructura", "HVAC", "Otros"]
+CRITICIDADES = ["Baja", "Media", "Alta", "Crítica"]
+ESTADOS_OT = ["Abierta", "Concluida"]
+ROLES = ["Admin", "Programador", "Tecnico"]
+ESPECIALIDADES = ["Técnico Infraestructura", "Tecnico Soldadura", "Tecnico Electricista", "Tecnico Aire Acondicionado", "Otros"]
@@ -0,0 +1,182 @@
+"""Cola local (SQLite) de cierres de OTs pendientes de enviar a Supabase.
+
+Al cerrar una orden, el informe y la evidencia se guardan primero en un archivo
+SQLite junto a la app (modo WAL, escritura sincronizada) y el técnico recibe la
+confirmación de inmediato. Un hilo de fondo envía los cierres por lotes: sube
+las evidencias y aplica los cierres con la función cerrar_ordenes
+(sql/05_cierre_ordenes.sql), que usa la clave de cada cierre para no aplicarlo
+dos veces y, con sql/06_analitica.sql, guarda como fecha de cierre la hora en
+que el técnico lo registró. Si falla la red el cierre sigue en la cola y se reintenta con espera
+creciente; solo se borra cuando Supabase lo confirma.
+
+Las peticiones de cada vuelta del envío (subidas y cierres) se miden juntas
+como una ejecución de la pantalla "Cola de cierres" en el log cmms.metricas;
+no llegan al panel de rendimiento, que solo muestra las de la sesión.
+"""
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from instrumentacion import iniciar_medicion
+
+RUTA_COLA = "cola_cierres.db"
+TAM_LOTE = 50
+INTERVALO_SEGUNDOS = 5
+ESPERA_BASE_SEGUNDOS = 2
+ESPERA_MAX_SEGUNDOS = 300
+
+log = logging.getLogger(__name__)
+
+_ESQUEMA = """
+create table if not exists cierres (
+    clave text primary key,
+    ot_id integer not null,
+    comentarios text,
+    archivo blob,
+    nombre_archivo text,
+    tipo_archivo text,
+    evidencia_url text,
+    creado_en text not null,
+    intentos integer not null default 0,
+    proximo_intento real not null default 0,
+    ultimo_error text
+)
+"""
+
+
+def _falta_funcion(error):
+    # PGRST202: la función no existe en la base
+    return getattr(error, "code", None) == "PGRST202" or "Could not find the function" in str(error)
+
+
+class ColaCierres:
+    """Cola persistente de cierres con envío por lotes en segundo plano."""
+
+    def __init__(self, cliente, subidor, ruta=RUTA_COLA, al_aplicar=None,
+                 tam_lote=TAM_LOTE, intervalo=INTERVALO_SEGUNDOS, iniciar=True):
+        self.cliente = cliente
+        self.subidor = subidor
+        self.al_aplicar = al_aplicar
+        self.tam_lote = tam_lote
+        self.intervalo = intervalo
+        self.ultimo_envio = None
+        self.ultimo_error = None
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._detenida = False
+        self._db = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._db.execute("pragma journal_mode=wal")
+        self._db.execute("pragma synchronous=full")
+        self._db.execute(_ESQUEMA)
+        if iniciar:
+            # Lo que quedó en la cola de una ejecución anterior se envía al arrancar
+            threading.Thread(target=self._bucle, name="cola-cierres", daemon=True).start()
+
+    def _sql(self, consulta, parametros=()):
+        with self._lock:
+            return self._db.execute(consulta, parametros).fetchall()
+
+    # --- lado de la app ---
+    def encolar(self, ot_id, comentarios, datos=None, nombre_archivo=None, tipo_archivo=None):
+        """Guarda el cierre en disco y retorna su clave. El envío ocurre en segundo plano"""
+        clave = str(uuid.uuid4())
+        self._sql(
+            "insert into cierres (clave, ot_id, comentarios, archivo, nombre_archivo, tipo_archivo, creado_en) "
+            "values (?, ?, ?, ?, ?, ?, ?)",
+            (clave, int(ot_id), comentarios, datos, nombre_archivo, tipo_archivo, datetime.now(timezone.utc).isoformat()),
+        )
+        self._despertar.set()
+        return clave
+
+    def profundidad(self):
+        """Cierres que aún no confirma Supabase"""
+        return self._sql("select count(*) from cierres")[0][0]
+
+    def ots_en_cola(self):
+        return {fila[0] for fila in self._sql("select ot_id from cierres")}
+
+    def con_error(self):
+        """Cierres que ya fallaron al menos una vez, con su último error"""
+        filas = self._sql("select ot_id, creado_en, intentos, ultimo_error from cierres where intentos > 0 order by creado_en")
+        return [dict(zip(("ot_id", "creado_en", "intentos", "error"), fila)) for fila in filas]
+
+    def detener(self):
+        self._detenida = True
+        self._despertar.set()
+
+    # --- envío ---
+    def _bucle(self):
+        while not self._detenida:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            medicion = iniciar_medicion("cola-cierres", pantalla="Cola de cierres")
+            try:
+                # Si el lote salió completo puede haber más: seguir hasta vaciar
+                while self.vaciar() == self.tam_lote:
+                    pass
+            except Exception:
+                log.exception("Error inesperado enviando la cola de cierres")
+            if medicion.eventos:
+                medicion.finalizar()
+
+    def vaciar(self):
+        """Envía un lote de cierres listos para (re)intentar. Retorna cuántos se aplicaron"""
+        filas = self._sql(
+            "select clave, ot_id, comentarios, archivo, nombre_archivo, tipo_archivo, evidencia_url, creado_en from cierres "
+            "where proximo_intento <= ? order by creado_en limit ?",
+            (time.time(), self.tam_lote),
+        )
+        listos = []
+        for clave, ot_id, comentarios, archivo, nombre_archivo, tipo_archivo, url, creado_en in filas:
+            if archivo is not None and url is None:
+                try:
+                    url = self.subidor.subir(archivo, nombre_archivo, tipo_archivo)
+                except Exception as e:
+                    self._posponer([clave], e)
+                    continue
+                # La URL queda guardada: si falla el cierre, la foto no se vuelve a subir
+                self._sql("update cierres set evidencia_url = ?, archivo = null where clave = ?", (url, clave))
+            listos.append({"clave": clave, "ot_id": ot_id, "comentarios": comentarios, "evidencia_url": url,
+                           "fecha_cierre": creado_en})
+        if not listos:
+            return 0
+
+        try:
+            self._aplicar(listos)
+        except Exception as e:
+            self._posponer([c["clave"] for c in listos], e)
+            return 0
+        # Primero se invalida la caché y luego se saca de la cola: la app nunca ve la OT como pendiente
+        if self.al_aplicar:
+            self.al_aplicar([c["ot_id"] for c in listos])
+        claves = [c["clave"] for c in listos]
+        self._sql(f"delete from cierres where clave in ({','.join('?' * len(claves))})", claves)
+        self.ultimo_envio = datetime.now()
+        self.ultimo_error = None
+        return len(listos)
+
+    def _aplicar(self, cierres):
+        try:
+            self.cliente.rpc("cerrar_ordenes", {"p_cierres": cierres}).execute()
+        except Exception as e:
+            if not _falta_funcion(e):
+                raise
+            # Sin sql/05: una petición por cierre (reenviar el mismo cierre deja el mismo resultado)
+            for c in cierres:
+                datos = {"estado": "Concluida", "comentarios_cierre": c["comentarios"]}
+                if c["evidencia_url"]:
+                    datos["evidencia_url"] = c["evidencia_url"]
+                self.cliente.table("ordenes").update(datos).eq("id", c["ot_id"]).execute()
+
+    def _posponer(self, claves, error):
+        self.ultimo_error = str(error)
+        log.warning("Cierre(s) pospuesto(s) para reintentar: %s", error)
+        for clave in claves:
+            self._sql(
+                "update cierres set intentos = intentos + 1, ultimo_error = ?, "
+                "proximo_intento = ? + min(?, ? * (1 << intentos)) where clave = ?",
+                (str(error), time.time(), ESPERA_MAX_SEGUNDOS, ESPERA_BASE_SEGUNDOS, clave),
+            )
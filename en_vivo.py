@@ -0,0 +1,179 @@
+"""Modo en vivo: cambios de `ordenes` aplicados a una vista en memoria.
+
+SondeoOrdenes es la fuente de cambios: pide a Supabase solo las filas con id o
+updated_at posteriores a la marca de agua y los borrados nuevos de
+registro_eliminaciones (ver sql/02_sincronizacion_incremental.sql). VistaOrdenes
+guarda las órdenes pendientes y les aplica cada lote de cambios sin volver a
+leer la tabla; el conteo por estado y criticidad se relee de resumen_ordenes
+(unas pocas filas) solo cuando hubo cambios. La vista es compartida: por más
+sesiones que estén en vivo, a Supabase se le pregunta una vez por intervalo.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+# Cada cuánto se buscan cambios y se refrescan las pantallas en vivo
+INTERVALO_EN_VIVO_SEGUNDOS = 10
+TAM_PAGINA = 1000
+# Margen sobre updated_at para no perder transacciones que confirmaron tarde
+SOLAPE_SEGUNDOS = 5
+
+COLUMNAS_PENDIENTES = ["id", "activo_id", "descripcion", "criticidad", "estado", "tecnico_asignado", "updated_at"]
+
+
+def _fecha(valor):
+    return pd.to_datetime(valor, utc=True)
+
+
+class SondeoOrdenes:
+    """Fuente de cambios de `ordenes` por sondeo de la marca de agua."""
+
+    def __init__(self, cliente, tam_pagina=TAM_PAGINA):
+        self.cliente = cliente
+        self.tam_pagina = tam_pagina
+
+    def _leer_paginado(self, tabla, columnas, filtrar, desde_id=0):
+        filas, ultimo_id = [], desde_id
+        while True:
+            query = filtrar(self.cliente.table(tabla).select(columnas)).gt("id", ultimo_id)
+            lote = query.order("id").limit(self.tam_pagina).execute().data
+            filas.extend(lote)
+            if len(lote) < self.tam_pagina:
+                return filas
+            ultimo_id = lote[-1]["id"]
+
+    def resumen(self):
+        """Conteo por estado y criticidad (tabla resumen_ordenes)"""
+        data = self.cliente.table("resumen_ordenes").select("estado, criticidad, total").execute().data
+        return pd.DataFrame(data, columns=["estado", "criticidad", "total"])
+
+    def pendientes(self):
+        """Órdenes no concluidas con las columnas que usan las pantallas"""
+        return self._leer_paginado("ordenes", ",".join(COLUMNAS_PENDIENTES), lambda q: q.neq("estado", "Concluida"))
+
+    def marca_inicial(self):
+        """(max_id, max_updated_at, max_eliminacion) actuales, para empezar a seguir cambios desde aquí"""
+        ultima = self.cliente.table("ordenes").select("id, updated_at").order("updated_at", desc=True).limit(1).execute().data
+        max_id = self.cliente.table("ordenes").select("id").order("id", desc=True).limit(1).execute().data
+        eliminacion = (
+            self.cliente.table("registro_eliminaciones").select("id")
+            .order("id", desc=True).limit(1).execute().data
+        )
+        return (
+            max_id[0]["id"] if max_id else 0,
+            _fecha(ultima[0]["updated_at"]) if ultima else None,
+            eliminacion[0]["id"] if eliminacion else 0,
+        )
+
+    def cambios(self, max_id, max_updated_at, max_eliminacion):
+        """Filas creadas o modificadas y borrados posteriores a la marca de agua.
+        Puede repetir filas del margen de solape: quien las aplique debe tolerarlo."""
+        filtro = f"id.gt.{max_id}"
+        if max_updated_at is not None:
+            desde = max_updated_at - timedelta(seconds=SOLAPE_SEGUNDOS)
+            filtro += f',updated_at.gte."{desde.isoformat()}"'
+        filas = self._leer_paginado("ordenes", ",".join(COLUMNAS_PENDIENTES), lambda q: q.or_(filtro))
+        eliminados = self._leer_paginado(
+            "registro_eliminaciones", "id, registro_id", lambda q: q.eq("tabla", "ordenes"), desde_id=max_eliminacion
+        )
+        return filas, eliminados
+
+
+class VistaOrdenes:
+    """Pendientes y conteos de órdenes, mantenidos al día con los deltas de la fuente."""
+
+    def __init__(self, fuente, intervalo=INTERVALO_EN_VIVO_SEGUNDOS):
+        self.fuente = fuente
+        self.intervalo = intervalo
+        self.pendientes = pd.DataFrame(columns=COLUMNAS_PENDIENTES)
+        self.resumen = pd.DataFrame(columns=["estado", "criticidad", "total"])
+        self.version = 0
+        self.actualizada_en = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._cargada = False
+        self._vencida = True
+        self._sondeada_en = 0.0
+        self._max_id = 0
+        self._max_updated_at = None
+        self._max_eliminacion = 0
+        # updated_at de las filas recibidas dentro del margen de solape, para ignorar repeticiones
+        self._vistas = {}
+
+    def invalidar(self):
+        """Busca cambios en la próxima llamada a actualizar(), sin esperar el intervalo"""
+        self._vencida = True
+
+    def actualizar(self):
+        """Trae y aplica los cambios si venció el intervalo. Retorna True si la vista cambió.
+        Si la base no soporta deltas deja el motivo en `error` y la vista sin cambios."""
+        with self._lock:
+            if not self._vencida and time.monotonic() - self._sondeada_en < self.intervalo:
+                return False
+            try:
+                if not self._cargada:
+                    self._cargar()
+                    cambio = True
+                else:
+                    cambio = self._sincronizar()
+            except Exception as e:
+                self.error = str(e)
+                cambio = False
+            else:
+                self.error = None
+                self.actualizada_en = datetime.now()
+            # También tras un error, para no reintentar en cada rerun
+            self._sondeada_en = time.monotonic()
+            self._vencida = False
+            if cambio:
+                self.version += 1
+            return cambio
+
+    def _cargar(self):
+        # La marca va primero: lo que cambie mientras se carga se vuelve a aplicar después
+        self._max_id, self._max_updated_at, self._max_eliminacion = self.fuente.marca_inicial()
+        self.pendientes = pd.DataFrame(self.fuente.pendientes(), columns=COLUMNAS_PENDIENTES)
+        self.resumen = self.fuente.resumen()
+        self._vistas = {}
+        self._cargada = True
+
+    def _sincronizar(self):
+        filas, eliminados = self.fuente.cambios(self._max_id, self._max_updated_at, self._max_eliminacion)
+        nuevas = [f for f in filas if self._vistas.get(f["id"]) != f["updated_at"]]
+        ids_eliminados = [e["registro_id"] for e in eliminados]
+        if eliminados:
+            self._max_eliminacion = eliminados[-1]["id"]
+        if filas:
+            self._max_id = max(self._max_id, max(f["id"] for f in filas))
+            ultima = max(_fecha(f["updated_at"]) for f in filas)
+            self._max_updated_at = ultima if self._max_updated_at is None else max(self._max_updated_at, ultima)
+            self._recordar(filas)
+        if not nuevas and not ids_eliminados:
+            return False
+
+        df = self.pendientes
+        cambiados = pd.DataFrame(nuevas, columns=COLUMNAS_PENDIENTES)
+        df = df[~df["id"].isin(cambiados["id"].tolist() + ids_eliminados)]
+        abiertas = cambiados[cambiados["estado"] != "Concluida"]
+        if not abiertas.empty:
+            df = pd.concat([df, abiertas], ignore_index=True) if not df.empty else abiertas
+        self.pendientes = df.sort_values("id", ignore_index=True)
+        # El conteo lo mantiene el trigger de resumen_ordenes: son unas pocas filas
+        self.resumen = self.fuente.resumen()
+        return True
+
+    def _recordar(self, filas):
+        for f in filas:
+            self._vistas[f["id"]] = f["updated_at"]
+        limite = self._max_updated_at - timedelta(seconds=SOLAPE_SEGUNDOS)
+        self._vistas = {i: u for i, u in self._vistas.items() if _fecha(u) >= limite}
+
+    def pagina_pendientes(self, tecnico=None, despues_de_id=0, limite=25):
+        """Página de pendientes (mismo contrato que la consulta paginada): (DataFrame, hay_mas)"""
+        df = self.pendientes
+        if tecnico:
+            df = df[df["tecnico_asignado"] == tecnico]
+        df = df[df["id"] > despues_de_id].head(limite + 1)
+        return df.head(limite).reset_index(drop=True), len(df) > limite
@@ -0,0 +1,96 @@
+"""Procesamiento y subida de las evidencias de cierre.
+
+Las fotos se reducen y recomprimen antes de subirlas, se guardan con el hash
+de su contenido como nombre (una misma foto no se sube dos veces) y se genera
+una miniatura en miniaturas/<mismo nombre>. La subida se reintenta con espera
+creciente; la llama el hilo de envío de la cola de cierres (cola_cierres.py).
+"""
+import hashlib
+import io
+import time
+
+from PIL import Image, ImageOps
+
+BUCKET = "evidencias"
+LADO_MAX = 1600
+LADO_MINIATURA = 320
+CALIDAD_JPEG = 82
+REINTENTOS = 4
+ESPERA_BASE_SEGUNDOS = 0.5
+
+
+def procesar_imagen(datos, lado_max=LADO_MAX, lado_miniatura=LADO_MINIATURA, calidad=CALIDAD_JPEG):
+    """Reduce la foto a `lado_max` px y la recomprime en JPEG.
+    Retorna (bytes, content_type, miniatura). Si el archivo no es una imagen
+    se devuelve sin cambios y sin miniatura."""
+    try:
+        imagen = Image.open(io.BytesIO(datos))
+        imagen = ImageOps.exif_transpose(imagen).convert("RGB")
+    except Exception:
+        return datos, None, None
+
+    imagen.thumbnail((lado_max, lado_max))
+    salida = io.BytesIO()
+    imagen.save(salida, format="JPEG", quality=calidad, optimize=True)
+
+    imagen.thumbnail((lado_miniatura, lado_miniatura))
+    miniatura = io.BytesIO()
+    imagen.save(miniatura, format="JPEG", quality=calidad, optimize=True)
+    return salida.getvalue(), "image/jpeg", miniatura.getvalue()
+
+
+def nombre_por_contenido(datos, extension):
+    """Nombre del objeto a partir del hash SHA-256 del contenido"""
+    return f"{hashlib.sha256(datos).hexdigest()[:32]}{extension}"
+
+
+def con_reintentos(funcion, intentos=REINTENTOS, espera_base=ESPERA_BASE_SEGUNDOS):
+    """Ejecuta `funcion` reintentando con espera exponencial; relanza el último error"""
+    for intento in range(intentos):
+        try:
+            return funcion()
+        except Exception:
+            if intento == intentos - 1:
+                raise
+            time.sleep(espera_base * 2 ** intento)
+
+
+def _es_duplicado(error):
+    if str(getattr(error, "status", "")) == "409":
+        return True
+    texto = str(error)
+    return "Duplicate" in texto or "already exists" in texto
+
+
+class SubidorEvidencias:
+    """Reduce y sube evidencias al bucket."""
+
+    def __init__(self, cliente, lado_max=LADO_MAX):
+        self.cliente = cliente
+        self.lado_max = lado_max
+
+    def subir(self, datos, nombre_original, content_type=None):
+        """Procesa y sube la evidencia. Retorna la URL pública"""
+        datos, tipo, miniatura = procesar_imagen(datos, lado_max=self.lado_max)
+        if tipo is None:
+            extension = "." + nombre_original.rsplit(".", 1)[-1].lower() if "." in nombre_original else ""
+            tipo = content_type or "application/octet-stream"
+        else:
+            extension = ".jpg"
+        nombre = nombre_por_contenido(datos, extension)
+
+        bucket = self.cliente.storage.from_(BUCKET)
+        self._subir_objeto(bucket, nombre, datos, tipo)
+        if miniatura is not None:
+            self._subir_objeto(bucket, f"miniaturas/{nombre}", miniatura, tipo)
+        return bucket.get_public_url(nombre)
+
+    def _subir_objeto(self, bucket, nombre, datos, tipo):
+        def intento():
+            try:
+                bucket.upload(path=nombre, file=datos, file_options={"content-type": tipo})
+            except Exception as e:
+                # El mismo contenido ya está en el bucket: no hay nada que subir
+                if not _es_duplicado(e):
+                    raise
+        con_reintentos(intento)
@@ -0,0 +1,140 @@
+"""Exportación del historial de órdenes a CSV, Parquet o Excel.
+
+Las órdenes se leen por páginas (paginación por id) con los filtros aplicados
+en Supabase, se unen con los datos del activo y se escriben al buffer de
+salida página por página, así en memoria solo hay una página a la vez.
+"""
+import io
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+from sincronizacion import falta_columna
+
+TAM_PAGINA = 1000
+
+COLUMNAS_ORDENES = [
+    "id", "activo_id", "descripcion", "criticidad", "estado", "fecha_creacion", "fecha_cierre",
+    "tecnico_asignado", "comentarios_cierre", "evidencia_url", "preventiva", "programada_para",
+]
+# Columnas que agregan los scripts de sql/, de la más nueva a la más antigua. Si la base
+# aún no las tiene se exportan vacías en lugar de fallar la exportación completa.
+COLUMNAS_OPCIONALES = [("preventiva", "programada_para"), ("fecha_cierre",)]
+COLUMNAS_ACTIVO = {"nombre": "activo_nombre", "ubicacion": "activo_ubicacion", "categoria": "activo_categoria"}
+COLUMNAS_EXPORTACION = COLUMNAS_ORDENES + list(COLUMNAS_ACTIVO.values())
+
+FORMATOS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+_TIPOS_PARQUET = {"id": pa.int64(), "activo_id": pa.int64(), "preventiva": pa.bool_()}
+_ESQUEMA_PARQUET = pa.schema([(c, _TIPOS_PARQUET.get(c, pa.string())) for c in COLUMNAS_EXPORTACION])
+
+
+def _selecciones():
+    # Primero todas las columnas; luego sin las opcionales más nuevas, y así hacia atrás
+    columnas = list(COLUMNAS_ORDENES)
+    yield columnas
+    for grupo in COLUMNAS_OPCIONALES:
+        columnas = [c for c in columnas if c not in grupo]
+        yield columnas
+
+
+def paginas_ordenes(cliente, desde=None, hasta=None, estados=None, tam_pagina=TAM_PAGINA):
+    """Genera (DataFrame, total) por cada página de órdenes que cumple los filtros.
+    `desde` y `hasta` son fechas inclusivas sobre fecha_creacion."""
+    ultimo_id = 0
+    total = None
+    selecciones = _selecciones()
+    columnas = next(selecciones)
+    while True:
+        query = cliente.table("ordenes").select(",".join(columnas), count="exact" if total is None else None)
+        if desde:
+            query = query.gte("fecha_creacion", desde.isoformat())
+        if hasta:
+            query = query.lt("fecha_creacion", (hasta + pd.Timedelta(days=1)).isoformat())
+        if estados:
+            query = query.in_("estado", list(estados))
+        try:
+            response = query.gt("id", ultimo_id).order("id").limit(tam_pagina).execute()
+        except Exception as e:
+            siguiente = next(selecciones, None) if total is None and falta_columna(e) else None
+            if siguiente is None:
+                raise
+            columnas = siguiente
+            continue
+        if total is None:
+            total = response.count or len(response.data)
+        if not response.data:
+            return
+        yield pd.DataFrame(response.data, columns=columnas).reindex(columns=COLUMNAS_ORDENES), total
+        if len(response.data) < tam_pagina:
+            return
+        ultimo_id = response.data[-1]["id"]
+
+
+def _unir_activos(pagina, df_activos):
+    if df_activos.empty:
+        datos = pd.DataFrame(columns=["id"] + list(COLUMNAS_ACTIVO))
+    else:
+        datos = df_activos[["id"] + list(COLUMNAS_ACTIVO)]
+    pagina = pagina.merge(
+        datos.rename(columns=COLUMNAS_ACTIVO).rename(columns={"id": "activo_id"}),
+        on="activo_id", how="left",
+    )
+    return pagina[COLUMNAS_EXPORTACION]
+
+
+def exportar_ordenes(cliente, formato, df_activos, desde=None, hasta=None, estados=None,
+                     tam_pagina=TAM_PAGINA, al_avanzar=None):
+    """Arma el archivo de exportación y retorna sus bytes.
+    `al_avanzar(filas_escritas, total)` se llama después de cada página."""
+    buffer = io.BytesIO()
+    escritas = 0
+
+    if formato == "CSV":
+        buffer.write("\ufeff".encode("utf-8"))  # BOM para que Excel respete los acentos
+        texto = io.TextIOWrapper(buffer, encoding="utf-8", newline="", write_through=True)
+
+        def escribir(df, primera):
+            df.to_csv(texto, header=primera, index=False)
+    elif formato == "Parquet":
+        parquet = pq.ParquetWriter(buffer, _ESQUEMA_PARQUET)
+        columnas_texto = {c: "string" for c in COLUMNAS_EXPORTACION if c not in _TIPOS_PARQUET}
+        columnas_texto["preventiva"] = "boolean"
+
+        def escribir(df, primera):
+            tabla = pa.Table.from_pandas(df.astype(columnas_texto), schema=_ESQUEMA_PARQUET, preserve_index=False)
+            parquet.write_table(tabla)
+    elif formato == "Excel":
+        # write_only va volcando las filas a disco en lugar de mantener el libro en memoria
+        libro = Workbook(write_only=True)
+        hoja = libro.create_sheet("ordenes")
+        hoja.append(COLUMNAS_EXPORTACION)
+
+        def escribir(df, primera):
+            for fila in df.astype(object).where(df.notna(), None).itertuples(index=False):
+                hoja.append(fila)
+    else:
+        raise ValueError(f"Formato no soportado: {formato}")
+
+    for pagina, total in paginas_ordenes(cliente, desde, hasta, estados, tam_pagina):
+        pagina = _unir_activos(pagina, df_activos)
+        escribir(pagina, escritas == 0)
+        escritas += len(pagina)
+        if al_avanzar:
+            al_avanzar(escritas, total)
+
+    if formato == "CSV":
+        if escritas == 0:
+            pd.DataFrame(columns=COLUMNAS_EXPORTACION).to_csv(texto, index=False)
+        texto.detach()
+    elif formato == "Parquet":
+        parquet.close()
+    else:
+        libro.save(buffer)
+    return buffer.getvalue()
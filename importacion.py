@@ -0,0 +1,120 @@
+"""Importación masiva de activos y órdenes históricas desde CSV o Excel.
+
+La validación se hace por columnas completas con pandas y la escritura en
+inserts de varias filas por lote. Cada lote se reporta por separado, así una
+importación interrumpida se reanuda reintentando solo los lotes que fallaron.
+"""
+import io
+import math
+
+import pandas as pd
+
+from catalogos import CATEGORIAS, CRITICIDADES, ESTADOS_OT
+
+TAM_LOTE = 500
+
+ESQUEMAS = {
+    "activos": {
+        "obligatorias": ["nombre", "ubicacion", "categoria"],
+        "opcionales": [],
+    },
+    "ordenes": {
+        "obligatorias": ["activo_id", "descripcion", "criticidad", "estado", "fecha_creacion"],
+        "opcionales": ["tecnico_asignado", "comentarios_cierre", "evidencia_url", "fecha_cierre"],
+    },
+}
+
+
+def leer_archivo(nombre, datos):
+    """Lee un CSV (separado por coma o punto y coma) o un Excel como texto"""
+    if nombre.lower().endswith((".xlsx", ".xls")):
+        return pd.read_excel(io.BytesIO(datos), dtype=str)
+    primera_linea = datos.split(b"\n", 1)[0]
+    separador = ";" if primera_linea.count(b";") > primera_linea.count(b",") else ","
+    return pd.read_csv(io.BytesIO(datos), dtype=str, sep=separador, encoding="utf-8-sig")
+
+
+def validar(tabla, df, ids_activos=()):
+    """Separa las filas válidas de las que tienen errores.
+    Retorna (DataFrame válido listo para insertar, DataFrame de errores con fila y motivo).
+    Lanza ValueError si faltan columnas obligatorias."""
+    esquema = ESQUEMAS[tabla]
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    faltantes = [c for c in esquema["obligatorias"] if c not in df.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+
+    columnas = [c for c in esquema["obligatorias"] + esquema["opcionales"] if c in df.columns]
+    df = df[columnas].apply(lambda col: col.str.strip()).replace("", None)
+
+    problemas = []
+
+    def marcar(mascara, motivo):
+        # La fila 1 del archivo es el encabezado
+        problemas.append(pd.DataFrame({"fila": df.index[mascara] + 2, "error": motivo}))
+
+    for col in esquema["obligatorias"]:
+        marcar(df[col].isna(), f"'{col}' está vacío")
+
+    if tabla == "activos":
+        marcar(df["categoria"].notna() & ~df["categoria"].isin(CATEGORIAS), "categoria no permitida")
+    else:
+        marcar(df["criticidad"].notna() & ~df["criticidad"].isin(CRITICIDADES), "criticidad no permitida")
+        marcar(df["estado"].notna() & ~df["estado"].isin(ESTADOS_OT), "estado no permitido")
+
+        activo_id = pd.to_numeric(df["activo_id"], errors="coerce")
+        marcar(df["activo_id"].notna() & activo_id.isna(), "activo_id no es numérico")
+        marcar(activo_id.notna() & ~activo_id.isin(list(ids_activos)), "activo_id no existe")
+        df["activo_id"] = activo_id
+
+        fechas = pd.to_datetime(df["fecha_creacion"], errors="coerce", format="ISO8601")
+        marcar(df["fecha_creacion"].notna() & fechas.isna(), "fecha_creacion inválida (use AAAA-MM-DD)")
+        df["fecha_creacion"] = fechas.dt.strftime("%Y-%m-%dT%H:%M:%S")
+
+        # Requiere sql/06_analitica.sql. Obligatoria en las concluidas: la base no puede
+        # saber cuándo se cerró una orden histórica y sin ella no entraría en el MTTR
+        texto_cierre = df["fecha_cierre"] if "fecha_cierre" in df else pd.Series(None, index=df.index, dtype=object)
+        cierres = pd.to_datetime(texto_cierre, errors="coerce", format="ISO8601")
+        marcar((df["estado"] == "Concluida") & texto_cierre.isna(), "'fecha_cierre' está vacío (obligatorio si la orden está Concluida)")
+        marcar(texto_cierre.notna() & cierres.isna(), "fecha_cierre inválida (use AAAA-MM-DD)")
+        marcar(cierres < fechas, "fecha_cierre anterior a fecha_creacion")
+        if "fecha_cierre" in df:
+            df["fecha_cierre"] = cierres.dt.strftime("%Y-%m-%dT%H:%M:%S")
+
+    errores = pd.concat(problemas, ignore_index=True).sort_values("fila", ignore_index=True)
+    validas = df[~(df.index + 2).isin(errores["fila"])]
+    if tabla == "ordenes":
+        validas = validas.astype({"activo_id": "int64"})
+    return validas, errores
+
+
+def a_registros(df):
+    """Filas del DataFrame como dicts listos para Supabase (NaN -> None)"""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def total_lotes(registros, tam_lote=TAM_LOTE):
+    return math.ceil(len(registros) / tam_lote)
+
+
+def insertar_por_lotes(cliente, tabla, registros, lotes=None, tam_lote=TAM_LOTE, al_avanzar=None, on_conflict=None):
+    """Inserta los registros en lotes de `tam_lote` filas, un request por lote.
+    `lotes` restringe la operación a esos números de lote (para reanudar).
+    Con `on_conflict` (columnas de una clave única) se omiten las filas que ya existen.
+    Retorna {lote: error} con los lotes que fallaron."""
+    if lotes is None:
+        lotes = range(total_lotes(registros, tam_lote))
+    lotes = sorted(lotes)
+    fallidos = {}
+    for hechos, lote in enumerate(lotes, 1):
+        parte = registros[lote * tam_lote:(lote + 1) * tam_lote]
+        try:
+            if on_conflict:
+                cliente.table(tabla).upsert(parte, on_conflict=on_conflict, ignore_duplicates=True).execute()
+            else:
+                cliente.table(tabla).insert(parte).execute()
+        except Exception as e:
+            fallidos[lote] = str(e)
+        if al_avanzar:
+            al_avanzar(hechos, len(lotes))
+    return fallidos
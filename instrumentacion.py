@@ -0,0 +1,193 @@
+"""Medición de las peticiones a Supabase por ejecución (rerun) y por pantalla.
+
+ClienteInstrumentado envuelve al cliente de Supabase y anota cada petición
+(tabla, operación, latencia, filas y bytes aproximados) en la Medicion activa
+del hilo. Al finalizar, cada Medicion se escribe como una línea JSON en el
+logger "cmms.metricas". Las peticiones hechas fuera de una ejecución (por
+ejemplo en hilos de fondo sin contexto) se registran una por una.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+log = logging.getLogger("cmms.metricas")
+if not log.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+# Llamadas repetidas a la misma tabla/operación en una ejecución que indican un N+1
+UMBRAL_N_MAS_1 = 5
+
+_medicion_actual = contextvars.ContextVar("medicion_actual", default=None)
+
+
+class Medicion:
+    """Peticiones hechas durante una ejecución del script."""
+
+    def __init__(self, sesion, usuario=None, pantalla=None):
+        self.sesion = sesion
+        self.usuario = usuario
+        self.pantalla = pantalla
+        self.fecha = datetime.now(timezone.utc).isoformat()
+        self.eventos = []
+        self.duracion_ms = None
+        self._inicio = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def registrar(self, evento):
+        with self._lock:
+            self.eventos.append(evento)
+
+    def resumen(self):
+        """DataFrame con llamadas, latencia, filas y bytes por tabla y operación"""
+        with self._lock:
+            df = pd.DataFrame(self.eventos, columns=["tabla", "operacion", "ms", "filas", "bytes", "error"])
+        return (
+            df.groupby(["tabla", "operacion"], as_index=False)
+            .agg(llamadas=("ms", "size"), ms_total=("ms", "sum"), ms_max=("ms", "max"),
+                 filas=("filas", "sum"), bytes=("bytes", "sum"), errores=("error", "sum"))
+            .sort_values("ms_total", ascending=False, ignore_index=True)
+        )
+
+    def posibles_n_mas_1(self):
+        resumen = self.resumen()
+        return resumen[resumen["llamadas"] >= UMBRAL_N_MAS_1]
+
+    def a_dict(self):
+        resumen = self.resumen()
+        return {
+            "evento": "rerun",
+            "fecha": self.fecha,
+            "sesion": self.sesion,
+            "usuario": self.usuario,
+            "pantalla": self.pantalla,
+            "duracion_ms": self.duracion_ms,
+            "round_trips": int(resumen["llamadas"].sum()),
+            "ms_consultas": round(float(resumen["ms_total"].sum()), 1),
+            "filas": int(resumen["filas"].sum()),
+            "bytes": int(resumen["bytes"].sum()),
+            "detalle": resumen.round(1).to_dict("records"),
+        }
+
+    def finalizar(self, completa=True):
+        """Cierra la medición y la escribe en el log.
+        `completa=False` cuando la ejecución se interrumpió y no hay duración."""
+        if completa:
+            self.duracion_ms = round((time.perf_counter() - self._inicio) * 1000, 1)
+        log.info(json.dumps(self.a_dict(), ensure_ascii=False, default=str))
+
+
+def iniciar_medicion(sesion, usuario=None, pantalla=None):
+    """Crea la Medicion de la ejecución actual y la deja activa en este contexto"""
+    medicion = Medicion(sesion, usuario, pantalla)
+    _medicion_actual.set(medicion)
+    return medicion
+
+
+def _registrar(tabla, operacion, inicio, respuesta=None, error=False):
+    ms = round((time.perf_counter() - inicio) * 1000, 2)
+    data = getattr(respuesta, "data", None)
+    filas = len(data) if isinstance(data, list) else int(data is not None)
+    # Tamaño aproximado: la librería no expone el cuerpo HTTP crudo
+    bytes_ = len(json.dumps(data, default=str).encode()) if data is not None else 0
+    evento = {"tabla": tabla, "operacion": operacion, "ms": ms, "filas": filas, "bytes": bytes_, "error": error}
+    medicion = _medicion_actual.get()
+    if medicion is not None:
+        medicion.registrar(evento)
+    else:
+        log.info(json.dumps({"evento": "consulta", **evento}, ensure_ascii=False))
+
+
+_OPERACIONES = {"select", "insert", "upsert", "update", "delete"}
+
+
+class _ConsultaInstrumentada:
+    """Envuelve un request builder de postgrest y mide su execute()"""
+
+    def __init__(self, builder, tabla, operacion=None):
+        self._builder = builder
+        self._tabla = tabla
+        self._operacion = operacion
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._builder, nombre)
+        if not callable(atributo):
+            return atributo
+
+        def llamar(*args, **kwargs):
+            resultado = atributo(*args, **kwargs)
+            if hasattr(resultado, "execute"):
+                operacion = nombre if nombre in _OPERACIONES else self._operacion
+                return _ConsultaInstrumentada(resultado, self._tabla, operacion)
+            return resultado
+        return llamar
+
+    def execute(self):
+        inicio = time.perf_counter()
+        try:
+            respuesta = self._builder.execute()
+        except Exception:
+            _registrar(self._tabla, self._operacion or "select", inicio, error=True)
+            raise
+        _registrar(self._tabla, self._operacion or "select", inicio, respuesta)
+        return respuesta
+
+
+class _BucketInstrumentado:
+    _MEDIDOS = {"upload", "update", "download", "exists", "remove", "list"}
+
+    def __init__(self, bucket, nombre):
+        self._bucket = bucket
+        self._nombre = nombre
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._bucket, nombre)
+        if nombre not in self._MEDIDOS:
+            return atributo
+
+        def llamar(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                resultado = atributo(*args, **kwargs)
+            except Exception:
+                _registrar(f"storage:{self._nombre}", nombre, inicio, error=True)
+                raise
+            _registrar(f"storage:{self._nombre}", nombre, inicio)
+            return resultado
+        return llamar
+
+
+class _StorageInstrumentado:
+    def __init__(self, storage):
+        self._storage = storage
+
+    def from_(self, bucket):
+        return _BucketInstrumentado(self._storage.from_(bucket), bucket)
+
+    def __getattr__(self, nombre):
+        return getattr(self._storage, nombre)
+
+
+class ClienteInstrumentado:
+    """Cliente de Supabase que anota cada petición en la Medicion activa."""
+
+    def __init__(self, cliente):
+        self._cliente = cliente
+        self.storage = _StorageInstrumentado(cliente.storage)
+
+    def table(self, nombre):
+        return _ConsultaInstrumentada(self._cliente.table(nombre), nombre)
+
+    def rpc(self, nombre, params=None, **kwargs):
+        return _ConsultaInstrumentada(self._cliente.rpc(nombre, params, **kwargs), f"rpc:{nombre}", "rpc")
+
+    def __getattr__(self, nombre):
+        return getattr(self._cliente, nombre)
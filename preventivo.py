@@ -0,0 +1,248 @@
+"""Generación de OTs de mantenimiento preventivo (tarea programada, sin Streamlit).
+
+Lee los planes vigentes cuya próxima fecha ya llegó (sql/07_preventivo.sql),
+arma una OT por cada fecha del plan hasta el límite (hoy más la anticipación) y
+cada activo del plan (el activo indicado o todos los de su categoría), asigna a
+cada una el técnico de la especialidad con menos OTs abiertas y las inserta en
+lotes de varias filas. Las fechas ya pasadas de un plan atrasado se juntan en una
+sola OT. Después adelanta la próxima fecha de cada plan. Si la tarea se corta a mitad, volver a correrla no duplica
+OTs: la clave (plan_id, activo_id, programada_para) descarta las ya creadas.
+
+Uso (por ejemplo desde cron, una vez al día):
+    python preventivo.py
+    python preventivo.py --fecha 2026-01-31 --anticipacion 7 --simular
+
+Las credenciales se toman de SUPABASE_URL / SUPABASE_KEY o de .streamlit/secrets.toml.
+"""
+import argparse
+import heapq
+import logging
+import os
+import sys
+import tomllib
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import pandas as pd
+from supabase import create_client
+
+from importacion import TAM_LOTE, a_registros, insertar_por_lotes
+
+TAM_PAGINA = 1000
+CLAVE_OT = "plan_id,activo_id,programada_para"
+
+# Especialidad que atiende cada categoría de activo, si el plan no indica otra
+ESPECIALIDAD_POR_CATEGORIA = {
+    "Eléctrico": "Tecnico Electricista",
+    "Infraestructura": "Técnico Infraestructura",
+    "HVAC": "Tecnico Aire Acondicionado",
+}
+
+DIAS_SEMANA = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+
+log = logging.getLogger(__name__)
+
+
+def _leer_paginado(cliente, tabla, columnas, filtrar=lambda q: q):
+    filas, ultimo_id = [], 0
+    while True:
+        query = filtrar(cliente.table(tabla).select(columnas)).gt("id", ultimo_id)
+        lote = query.order("id").limit(TAM_PAGINA).execute().data
+        filas.extend(lote)
+        if len(lote) < TAM_PAGINA:
+            return filas
+        ultimo_id = lote[-1]["id"]
+
+
+def _sumar_meses(fecha, meses, dia):
+    indice = fecha.year * 12 + fecha.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, dia)
+
+
+def _fecha(valor):
+    # proxima_fecha llega como texto desde Supabase y como Timestamp desde la instantánea de la app
+    return pd.Timestamp(valor).date()
+
+
+def siguiente_fecha(plan, despues_de):
+    """Primera fecha del calendario del plan posterior a `despues_de`.
+    En los planes por intervalo se cuenta desde su fecha programada, así un
+    atraso de la tarea no corre el calendario."""
+    if plan["tipo"] == "intervalo":
+        programada = _fecha(plan["proxima_fecha"])
+        cada = int(plan["cada_dias"])
+        saltos = max((despues_de - programada).days // cada + 1, 1)
+        return programada + timedelta(days=saltos * cada)
+
+    dia = int(plan["dia"])
+    if plan["frecuencia"] == "semanal":
+        return despues_de + timedelta(days=(dia - despues_de.isoweekday() - 1) % 7 + 1)
+    if plan["frecuencia"] == "mensual":
+        return _sumar_meses(despues_de, 0 if despues_de.day < dia else 1, dia)
+    candidata = date(despues_de.year, int(plan["mes"]), dia)
+    return candidata if candidata > despues_de else date(despues_de.year + 1, int(plan["mes"]), dia)
+
+
+def proxima_desde(plan, hoy):
+    """Primera fecha del calendario del plan desde `hoy` (inclusive); su próxima
+    fecha si todavía no pasó"""
+    programada = _fecha(plan["proxima_fecha"])
+    return programada if programada >= hoy else siguiente_fecha(plan, hoy - timedelta(days=1))
+
+
+def ocurrencias(plan, hoy, limite):
+    """Fechas del calendario del plan hasta `limite` (inclusive). Si la próxima fecha
+    ya pasó, todo el atraso es una sola OT con esa fecha y se sigue desde `hoy`: un
+    plan diario que no corrió en meses no genera una OT por cada día perdido."""
+    programada = _fecha(plan["proxima_fecha"])
+    fechas = [programada] if programada < hoy else []
+    fecha = proxima_desde(plan, hoy)
+    while fecha <= limite:
+        fechas.append(fecha)
+        fecha = siguiente_fecha(plan, fecha)
+    return fechas
+
+
+def describir_programacion(plan):
+    """Texto corto de la programación de un plan, para mostrarlo en pantalla"""
+    if plan["tipo"] == "intervalo":
+        return f"Cada {int(plan['cada_dias'])} días"
+    dia = int(plan["dia"])
+    if plan["frecuencia"] == "semanal":
+        return f"Cada {DIAS_SEMANA[dia - 1].lower()}"
+    if plan["frecuencia"] == "mensual":
+        return f"El día {dia} de cada mes"
+    return f"Cada año el {dia}/{int(plan['mes']):02d}"
+
+
+def ordenes_de_planes(planes, activos):
+    """Una fila por (plan, activo): el activo del plan o todos los de su categoría"""
+    activos = activos[["id", "categoria"]].rename(columns={"id": "activo_id"})
+    por_activo = planes[planes["activo_id"].notna()].drop(columns="categoria").astype({"activo_id": "int64"})
+    por_activo = por_activo.merge(activos, on="activo_id")
+    por_categoria = planes[planes["activo_id"].isna()].drop(columns="activo_id").merge(activos, on="categoria")
+    return pd.concat([por_activo, por_categoria], ignore_index=True)
+
+
+def asignar_tecnicos(ordenes, tecnicos, carga):
+    """Técnico para cada OT: el de la especialidad requerida con menos OTs abiertas,
+    contando las que se le van asignando. Sin técnicos de esa especialidad, cualquiera.
+    `tecnicos` tiene nombre y especialidad; `carga` es {nombre: OTs abiertas}."""
+    colas = {}
+    for especialidad, grupo in [(None, tecnicos)] + list(tecnicos.groupby("especialidad")):
+        colas[especialidad] = [(carga.get(n, 0), n) for n in grupo["nombre"]]
+        heapq.heapify(colas[especialidad])
+    actual = dict(carga)
+
+    asignados = []
+    for especialidad in ordenes["especialidad_requerida"]:
+        cola = colas.get(especialidad) or colas[None]
+        if not cola:
+            asignados.append(None)
+            continue
+        # La carga guardada en la cola puede estar vieja si el técnico recibió OTs por otra cola
+        while True:
+            abiertas, nombre = heapq.heappop(cola)
+            if abiertas == actual.get(nombre, 0):
+                break
+            heapq.heappush(cola, (actual.get(nombre, 0), nombre))
+        actual[nombre] = abiertas + 1
+        heapq.heappush(cola, (abiertas + 1, nombre))
+        asignados.append(nombre)
+    return asignados
+
+
+def generar_preventivas(cliente, hoy=None, anticipacion=0, simular=False, tam_lote=TAM_LOTE):
+    """Crea las OTs de los planes vencidos (hasta hoy + `anticipacion` días) y adelanta los planes.
+    Retorna {"planes", "ordenes", "fallidos"}; con `simular` no escribe nada."""
+    hoy = hoy or date.today()
+    limite = hoy + timedelta(days=anticipacion)
+    planes = pd.DataFrame(_leer_paginado(
+        cliente, "planes_preventivos", "*",
+        lambda q: q.eq("vigente", True).lte("proxima_fecha", limite.isoformat()),
+    ))
+    if planes.empty:
+        return {"planes": 0, "ordenes": 0, "fallidos": {}}
+    # Enteros que pueden venir vacíos: sin esto pandas los vuelve float y Postgres rechaza "3.0"
+    planes = planes.astype({c: "Int64" for c in ("activo_id", "cada_dias", "dia", "mes")})
+
+    categorias = planes.loc[planes["activo_id"].isna(), "categoria"].unique().tolist()
+    ids = [int(i) for i in planes["activo_id"].dropna().unique()]
+    activos = pd.DataFrame(
+        (_leer_paginado(cliente, "activos", "id, categoria", lambda q: q.in_("categoria", categorias)) if categorias else [])
+        + (_leer_paginado(cliente, "activos", "id, categoria", lambda q: q.in_("id", ids)) if ids else []),
+        columns=["id", "categoria"],
+    ).drop_duplicates("id")
+    # Una OT por cada fecha del plan dentro de la anticipación, no solo por la próxima
+    fechas = [ocurrencias(plan, hoy, limite) for plan in planes.to_dict("records")]
+    ordenes = ordenes_de_planes(planes.assign(programada_para=fechas).explode("programada_para"), activos)
+
+    tecnicos = pd.DataFrame(
+        _leer_paginado(cliente, "usuarios", "id, nombre, especialidad", lambda q: q.eq("rol", "Tecnico")),
+        columns=["id", "nombre", "especialidad"],
+    )
+    abiertas = pd.DataFrame(
+        _leer_paginado(cliente, "ordenes", "id, tecnico_asignado", lambda q: q.neq("estado", "Concluida")),
+        columns=["id", "tecnico_asignado"],
+    )
+    carga = abiertas["tecnico_asignado"].value_counts().to_dict()
+
+    ordenes["especialidad_requerida"] = ordenes["especialidad"].fillna(ordenes["categoria"].map(ESPECIALIDAD_POR_CATEGORIA))
+    ordenes["tecnico_asignado"] = asignar_tecnicos(ordenes, tecnicos, carga)
+    ordenes["descripcion"] = "[Preventivo] " + ordenes["nombre"] + ": " + ordenes["descripcion"]
+    ordenes["estado"] = "Abierta"
+    ordenes["preventiva"] = True
+    ordenes["fecha_creacion"] = datetime.now(timezone.utc).isoformat()
+    ordenes["programada_para"] = ordenes["programada_para"].astype(str)
+    ordenes = ordenes.rename(columns={"id": "plan_id"})
+    registros = a_registros(ordenes[[
+        "activo_id", "descripcion", "criticidad", "estado", "fecha_creacion",
+        "tecnico_asignado", "preventiva", "plan_id", "programada_para",
+    ]])
+
+    # Cada plan avanza a su primera fecha posterior al límite (la siguiente a su última OT)
+    proximas = [siguiente_fecha(plan, limite).isoformat() for plan in planes.to_dict("records")]
+    resumen = {"planes": len(planes), "ordenes": len(registros), "fallidos": {}}
+    if simular:
+        return resumen
+
+    resumen["fallidos"] = insertar_por_lotes(cliente, "ordenes", registros, tam_lote=tam_lote, on_conflict=CLAVE_OT)
+    if resumen["fallidos"]:
+        # Los planes no avanzan: la próxima corrida reintenta y descarta las OTs ya creadas
+        return resumen
+    # Solo se cambia la fecha, y solo si sigue siendo la leída al empezar: así la tarea
+    # no pisa una pausa hecha mientras corría ni vuelve a crear un plan borrado
+    for plan_id, anterior, proxima in zip(planes["id"], planes["proxima_fecha"], proximas):
+        (cliente.table("planes_preventivos").update({"proxima_fecha": proxima})
+         .eq("id", int(plan_id)).eq("proxima_fecha", str(anterior)).execute())
+    return resumen
+
+
+def _credenciales():
+    url, key = os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY")
+    if url and key:
+        return url, key
+    ruta = Path(__file__).resolve().parent / ".streamlit" / "secrets.toml"
+    with open(ruta, "rb") as f:
+        secretos = tomllib.load(f)
+    return secretos["SUPABASE_URL"], secretos["SUPABASE_KEY"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera las OTs de los planes de mantenimiento preventivo vencidos")
+    parser.add_argument("--fecha", type=date.fromisoformat, default=None, help="Fecha de corte AAAA-MM-DD (por defecto hoy)")
+    parser.add_argument("--anticipacion", type=int, default=0, help="Días de anticipación con que se crean las OTs")
+    parser.add_argument("--simular", action="store_true", help="Solo informa cuántas OTs se crearían")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    cliente = create_client(*_credenciales())
+    resumen = generar_preventivas(cliente, hoy=args.fecha, anticipacion=args.anticipacion, simular=args.simular)
+    log.info("%s planes vencidos, %s OTs%s", resumen["planes"], resumen["ordenes"], " (simulación)" if args.simular else "")
+    for lote, error in resumen["fallidos"].items():
+        log.error("Lote %s falló: %s", lote + 1, error)
+    return 1 if resumen["fallidos"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
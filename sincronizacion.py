@@ -0,0 +1,230 @@
+"""Instantáneas locales de las tablas, sincronizadas por deltas.
+
+Cada tabla se descarga completa una sola vez. Después solo se piden a Supabase
+las filas con id o updated_at posteriores a la marca de agua, más los borrados
+registrados en registro_eliminaciones (ver sql/02_sincronizacion_incremental.sql).
+Si la base no tiene esas columnas, la tabla se recarga completa en cada ciclo.
+
+Cada instantánea puede pedir solo algunas columnas (proyección) y se guarda con
+tipos compactos: categorías para los campos de catálogo, enteros con nulos para
+los ids y fechas ya convertidas. Así cada tabla ocupa una fracción de la memoria
+que ocupan las columnas de texto (object) y viaja menos por la red.
+"""
+import threading
+import time
+from datetime import timedelta
+
+import pandas as pd
+
+from catalogos import CATEGORIAS, CRITICIDADES, ESPECIALIDADES, ESTADOS_OT, ROLES
+
+# Cada cuánto se consultan deltas si nadie invalidó la tabla
+INTERVALO_SYNC_SEGUNDOS = 15
+# Filas por petición (Supabase limita por defecto a 1000 filas por respuesta)
+TAM_PAGINA = 1000
+# Margen sobre updated_at para no perder transacciones que confirmaron tarde
+SOLAPE_SEGUNDOS = 5
+
+# Campos de catálogo: categoría con los valores conocidos primero (los demás se agregan al final)
+CATEGORICAS = {
+    "estado": ESTADOS_OT,
+    "criticidad": CRITICIDADES,
+    "rol": ROLES,
+    "categoria": CATEGORIAS,
+    "especialidad": ESPECIALIDADES,
+}
+FECHAS = ("fecha_creacion", "fecha_cierre", "updated_at", "programada_para", "proxima_fecha", "creado_en")
+
+
+def _es_id(columna):
+    return columna == "id" or columna.endswith("_id")
+
+
+def _fechas(serie):
+    try:
+        return pd.to_datetime(serie, format="ISO8601")
+    except ValueError:
+        # Mezcla de fechas con y sin zona horaria
+        return pd.to_datetime(serie, format="ISO8601", utc=True)
+
+
+def compactar(df, referencia=None):
+    """Convierte las columnas conocidas a tipos compactos. Las que ya lo son no se tocan.
+    Con `referencia` (otro DataFrame compactado) las categorías parten de las suyas, así
+    al concatenar ambos se conserva el tipo categoría."""
+    for columna in df.columns:
+        serie = df[columna]
+        if columna in CATEGORICAS:
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                continue
+            conocidos = CATEGORICAS[columna]
+            if referencia is not None and isinstance(referencia.dtypes.get(columna), pd.CategoricalDtype):
+                conocidos = list(referencia[columna].cat.categories)
+            otros = sorted(set(serie.dropna()) - set(conocidos))
+            df[columna] = serie.astype(pd.CategoricalDtype(conocidos + otros))
+        elif _es_id(columna) and not isinstance(serie.dtype, pd.Int64Dtype):
+            df[columna] = serie.astype("Int64")
+        elif columna in FECHAS and not pd.api.types.is_datetime64_any_dtype(serie):
+            try:
+                df[columna] = _fechas(serie)
+            except (ValueError, TypeError):
+                pass
+    return df
+
+
+def falta_columna(error):
+    # 42703: la columna pedida no existe (p. ej. aún no se ejecutó el script de sql/ que la agrega)
+    return getattr(error, "code", None) == "42703" or ("column" in str(error) and "does not exist" in str(error))
+
+
+class _Instantanea:
+    def __init__(self, columnas=None):
+        self.lock = threading.Lock()
+        # None = todas las columnas. Siempre se piden además id y updated_at (para los deltas)
+        self.columnas = columnas
+        self.seleccion = "*" if columnas is None else ",".join(dict.fromkeys(["id", *columnas, "updated_at"]))
+        self.df = None
+        self.max_id = 0
+        self.max_updated_at = None
+        self.max_eliminacion = 0
+        self.sincronizada_en = 0.0
+        self.incremental = True
+        self.vencida = True
+
+
+class AlmacenInstantaneas:
+    """Guarda un DataFrame por tabla y lo mantiene al día con deltas."""
+
+    def __init__(self, cliente, intervalo=INTERVALO_SYNC_SEGUNDOS, tam_pagina=TAM_PAGINA):
+        self.cliente = cliente
+        self.intervalo = intervalo
+        self.tam_pagina = tam_pagina
+        self._instantaneas = {}
+        self._lock = threading.Lock()
+        # False si la base no tiene registro_eliminaciones (sin sql/02): no se vuelve a consultar
+        self._con_registro = True
+
+    def _instantanea(self, tabla, columnas=None):
+        clave = (tabla, None if columnas is None else tuple(sorted(columnas)))
+        with self._lock:
+            if clave not in self._instantaneas:
+                self._instantaneas[clave] = _Instantanea(None if columnas is None else list(columnas))
+            return self._instantaneas[clave]
+
+    def obtener(self, tabla, columnas=None):
+        """DataFrame de la tabla ordenado por id, con las `columnas` pedidas (más id y
+        updated_at) o todas si es None. Tratar como solo lectura."""
+        inst = self._instantanea(tabla, columnas)
+        with inst.lock:
+            expirada = time.monotonic() - inst.sincronizada_en > self.intervalo
+            if inst.df is None or not inst.incremental:
+                if inst.df is None or inst.vencida or expirada:
+                    self._carga_completa(tabla, inst)
+            elif inst.vencida or expirada:
+                try:
+                    self._sincronizar(tabla, inst)
+                except Exception:
+                    # La base no soporta deltas para esta tabla: recargar completa
+                    inst.incremental = False
+                    self._carga_completa(tabla, inst)
+            return inst.df
+
+    def invalidar(self, tabla):
+        """Obliga a sincronizar la tabla (todas sus proyecciones) en la próxima lectura"""
+        with self._lock:
+            instantaneas = [inst for (nombre, _), inst in self._instantaneas.items() if nombre == tabla]
+        for inst in instantaneas:
+            inst.vencida = True
+
+    def _leer_paginado(self, tabla, filtrar=None, seleccion="*"):
+        filas, ultimo_id = [], None
+        while True:
+            query = self.cliente.table(tabla).select(seleccion)
+            if filtrar:
+                query = filtrar(query)
+            if ultimo_id is not None:
+                query = query.gt("id", ultimo_id)
+            lote = query.order("id").limit(self.tam_pagina).execute().data
+            filas.extend(lote)
+            if len(lote) < self.tam_pagina:
+                return filas
+            ultimo_id = lote[-1]["id"]
+
+    def _carga_completa(self, tabla, inst):
+        # La marca de borrados va primero: lo que se borre mientras se leen las páginas
+        # queda por encima de ella y se aplica en la siguiente sincronización
+        max_eliminacion = None
+        if self._con_registro:
+            try:
+                ultimo = (
+                    self.cliente.table("registro_eliminaciones").select("id")
+                    .order("id", desc=True).limit(1).execute().data
+                )
+                max_eliminacion = ultimo[0]["id"] if ultimo else 0
+            except Exception:
+                self._con_registro = False
+        try:
+            filas = self._leer_paginado(tabla, seleccion=inst.seleccion)
+        except Exception as e:
+            if inst.seleccion == "*" or not falta_columna(e):
+                raise
+            # Alguna columna pedida no existe en esta base: se piden todas y se recorta
+            inst.seleccion = "*"
+            filas = self._leer_paginado(tabla)
+        df = self._recortar(inst, pd.DataFrame(filas))
+        # Sin registro de borrados o sin updated_at no hay deltas: la tabla se recarga completa.
+        # Una tabla vacía no muestra sus columnas, así que ahí se pregunta por updated_at
+        if df.empty:
+            inst.incremental = max_eliminacion is not None and self._tiene_updated_at(tabla)
+        else:
+            inst.incremental = max_eliminacion is not None and "updated_at" in df.columns
+        inst.max_eliminacion = max_eliminacion or 0
+        self._guardar(inst, df)
+
+    def _tiene_updated_at(self, tabla):
+        try:
+            self.cliente.table(tabla).select("updated_at").limit(1).execute()
+            return True
+        except Exception:
+            return False
+
+    def _sincronizar(self, tabla, inst):
+        filtro = f"id.gt.{inst.max_id}"
+        if inst.max_updated_at is not None:
+            desde = inst.max_updated_at - timedelta(seconds=SOLAPE_SEGUNDOS)
+            filtro += f',updated_at.gte."{desde.isoformat()}"'
+        cambios = pd.DataFrame(self._leer_paginado(tabla, lambda q: q.or_(filtro), inst.seleccion))
+        cambios = compactar(self._recortar(inst, cambios), referencia=inst.df)
+
+        eliminados = self._leer_paginado(
+            "registro_eliminaciones",
+            lambda q: q.eq("tabla", tabla).gt("id", inst.max_eliminacion),
+        )
+        if eliminados:
+            inst.max_eliminacion = eliminados[-1]["id"]
+
+        df = inst.df
+        if not cambios.empty:
+            if not df.empty:
+                df = df[~df["id"].isin(cambios["id"])]
+            df = pd.concat([df, cambios], ignore_index=True)
+        if eliminados and not df.empty:
+            df = df[~df["id"].isin([e["registro_id"] for e in eliminados])]
+        if not cambios.empty or eliminados:
+            df = df.sort_values("id", ignore_index=True)
+        self._guardar(inst, df)
+
+    @staticmethod
+    def _recortar(inst, df):
+        if inst.columnas is None or df.empty:
+            return df
+        return df[[c for c in dict.fromkeys(["id", *inst.columnas, "updated_at"]) if c in df.columns]]
+
+    def _guardar(self, inst, df):
+        inst.df = compactar(df)
+        if not df.empty:
+            inst.max_id = int(df["id"].max())
+            if "updated_at" in df.columns:
+                inst.max_updated_at = pd.to_datetime(df["updated_at"], utc=True).max()
+        inst.sincronizada_en = time.monotonic()
+        inst.vencida = False
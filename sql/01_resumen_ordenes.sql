@@ -0,0 +1,49 @@
+-- Resumen de OTs por estado y criticidad para el Dashboard.
+-- Un trigger sobre "ordenes" lo mantiene al día en cada alta, cierre o baja,
+-- así el tablero lee unas pocas filas sin importar el tamaño del histórico.
+
+create table if not exists public.resumen_ordenes (
+    estado      text   not null,
+    criticidad  text   not null,
+    total       bigint not null default 0,
+    primary key (estado, criticidad)
+);
+
+create or replace function public.actualizar_resumen_ordenes()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        update resumen_ordenes
+           set total = total - 1
+         where estado = coalesce(old.estado, '')
+           and criticidad = coalesce(old.criticidad, '');
+    end if;
+
+    if tg_op in ('INSERT', 'UPDATE') then
+        insert into resumen_ordenes (estado, criticidad, total)
+        values (coalesce(new.estado, ''), coalesce(new.criticidad, ''), 1)
+        on conflict (estado, criticidad)
+        do update set total = resumen_ordenes.total + 1;
+    end if;
+
+    return null;
+end;
+$$;
+
+drop trigger if exists trg_resumen_ordenes on public.ordenes;
+create trigger trg_resumen_ordenes
+    after insert or delete or update of estado, criticidad on public.ordenes
+    for each row execute function public.actualizar_resumen_ordenes();
+
+-- Carga inicial a partir de las órdenes existentes
+insert into public.resumen_ordenes (estado, criticidad, total)
+select coalesce(estado, ''), coalesce(criticidad, ''), count(*)
+  from public.ordenes
+ group by 1, 2
+on conflict (estado, criticidad) do update set total = excluded.total;
+
+grant select on public.resumen_ordenes to anon, authenticated;
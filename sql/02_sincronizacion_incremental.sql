@@ -0,0 +1,56 @@
+-- Soporte para la sincronización incremental de la app (sincronizacion.py).
+-- Cada tabla sincronizada lleva "updated_at" y sus borrados quedan
+-- registrados en "registro_eliminaciones", así la app solo pide lo que cambió.
+
+create or replace function public.marcar_actualizado()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at = now();
+    return new;
+end;
+$$;
+
+create table if not exists public.registro_eliminaciones (
+    id            bigserial   primary key,
+    tabla         text        not null,
+    registro_id   bigint      not null,
+    eliminado_en  timestamptz not null default now()
+);
+
+create index if not exists registro_eliminaciones_tabla_id_idx
+    on public.registro_eliminaciones (tabla, id);
+
+create or replace function public.registrar_eliminacion()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    insert into registro_eliminaciones (tabla, registro_id) values (tg_table_name, old.id);
+    return old;
+end;
+$$;
+
+do $$
+declare
+    t text;
+begin
+    foreach t in array array['ordenes', 'activos', 'usuarios'] loop
+        execute format('alter table public.%I add column if not exists updated_at timestamptz not null default now()', t);
+        execute format('create index if not exists %I on public.%I (updated_at)', t || '_updated_at_idx', t);
+
+        execute format('drop trigger if exists %I on public.%I', 'trg_' || t || '_updated_at', t);
+        execute format('create trigger %I before update on public.%I for each row execute function public.marcar_actualizado()',
+                       'trg_' || t || '_updated_at', t);
+
+        execute format('drop trigger if exists %I on public.%I', 'trg_' || t || '_eliminacion', t);
+        execute format('create trigger %I after delete on public.%I for each row execute function public.registrar_eliminacion()',
+                       'trg_' || t || '_eliminacion', t);
+    end loop;
+end;
+$$;
+
+grant select on public.registro_eliminaciones to anon, authenticated;
@@ -0,0 +1,9 @@
+-- Índices trigram para los selectores con búsqueda (ilike '%texto%').
+-- Sin ellos cada búsqueda recorre la tabla completa.
+
+create extension if not exists pg_trgm;
+
+create index if not exists activos_nombre_trgm_idx    on public.activos  using gin (nombre gin_trgm_ops);
+create index if not exists activos_ubicacion_trgm_idx on public.activos  using gin (ubicacion gin_trgm_ops);
+create index if not exists usuarios_nombre_trgm_idx   on public.usuarios using gin (nombre gin_trgm_ops);
+create index if not exists usuarios_documento_trgm_idx on public.usuarios using gin (documento gin_trgm_ops);
@@ -0,0 +1,35 @@
+-- Baja de activos en una sola transacción: respaldo en auditoría, borrado de
+-- sus OTs y borrado de los activos. Recibe varios ids para la baja masiva.
+-- Uso desde la app: supabase.rpc("dar_de_baja_activos", {...})
+
+create or replace function public.dar_de_baja_activos(p_ids bigint[], p_motivo text, p_usuario text)
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    eliminados integer;
+begin
+    insert into auditoria_eliminados (tipo_registro, nombre_referencia, datos_respaldo, usuario_responsable)
+    select 'Activo',
+           a.nombre,
+           jsonb_build_object(
+               'id_original', a.id,
+               'nombre', a.nombre,
+               'ubicacion', a.ubicacion,
+               'categoria', a.categoria,
+               'motivo_baja', p_motivo
+           ),
+           p_usuario
+      from activos a
+     where a.id = any(p_ids);
+
+    delete from ordenes where activo_id = any(p_ids);
+    delete from activos where id = any(p_ids);
+    get diagnostics eliminados = row_count;
+    return eliminados;
+end;
+$$;
+
+grant execute on function public.dar_de_baja_activos(bigint[], text, text) to anon, authenticated;
@@ -0,0 +1,39 @@
+-- Cierre de OTs por lotes desde la cola local de la app (cola_cierres.py).
+-- Cada cierre trae una clave única (idempotencia): si un lote se reenvía porque
+-- se perdió la respuesta, los cierres ya aplicados no se vuelven a aplicar.
+-- Uso desde la app: supabase.rpc("cerrar_ordenes", {"p_cierres": [...]})
+
+create table if not exists public.cierres_aplicados (
+    clave uuid primary key,
+    orden_id bigint not null,
+    aplicado_en timestamptz not null default now()
+);
+
+create or replace function public.cerrar_ordenes(p_cierres jsonb)
+returns setof text
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    c jsonb;
+begin
+    for c in select * from jsonb_array_elements(p_cierres) loop
+        insert into cierres_aplicados (clave, orden_id)
+        values ((c->>'clave')::uuid, (c->>'ot_id')::bigint)
+        on conflict (clave) do nothing;
+
+        if found then
+            update ordenes
+               set estado = 'Concluida',
+                   comentarios_cierre = c->>'comentarios',
+                   evidencia_url = coalesce(c->>'evidencia_url', evidencia_url)
+             where id = (c->>'ot_id')::bigint;
+        end if;
+        -- Se devuelven todas las claves recibidas: aplicadas ahora o antes
+        return next c->>'clave';
+    end loop;
+end;
+$$;
+
+grant execute on function public.cerrar_ordenes(jsonb) to anon, authenticated;
@@ -0,0 +1,231 @@
+-- Analítica de mantenimiento: fecha de cierre de las OTs y resúmenes por semana
+-- (MTTR, backlog, fallas por activo y carga por técnico) mantenidos por trigger.
+-- Cada alta, cierre o baja de una orden suma o resta su aporte, así el tablero
+-- lee unas pocas filas por semana sin importar los años de histórico.
+-- Requiere 05_cierre_ordenes.sql (se redefine cerrar_ordenes para guardar la hora de cierre).
+
+-- 1. Fecha de cierre ----------------------------------------------------------
+alter table public.ordenes add column if not exists fecha_cierre timestamptz;
+
+-- Si alguien pasa una orden a Concluida sin indicar la hora, se toma la del momento.
+-- Solo al cerrarla: una orden que se inserta ya concluida (importación) trae su
+-- propia fecha o queda sin ella. Las que no están concluidas no tienen fecha de cierre.
+create or replace function public.marcar_fecha_cierre()
+returns trigger
+language plpgsql
+as $$
+begin
+    if new.estado <> 'Concluida' then
+        new.fecha_cierre = null;
+    elsif tg_op = 'UPDATE' and old.estado is distinct from 'Concluida' and new.fecha_cierre is null then
+        new.fecha_cierre = now();
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists trg_fecha_cierre on public.ordenes;
+create trigger trg_fecha_cierre
+    before insert or update of estado, fecha_cierre on public.ordenes
+    for each row execute function public.marcar_fecha_cierre();
+
+-- Las órdenes concluidas antes de este script quedan sin fecha de cierre: no se
+-- conoce (updated_at es la hora de su última modificación o de 02_sincronizacion).
+-- Cuentan como cerradas en el backlog pero no entran en el MTTR.
+
+-- La hora de cierre es la que registró el técnico, aunque el envío llegue más tarde
+create or replace function public.cerrar_ordenes(p_cierres jsonb)
+returns setof text
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    c jsonb;
+begin
+    for c in select * from jsonb_array_elements(p_cierres) loop
+        insert into cierres_aplicados (clave, orden_id)
+        values ((c->>'clave')::uuid, (c->>'ot_id')::bigint)
+        on conflict (clave) do nothing;
+
+        if found then
+            update ordenes
+               set estado = 'Concluida',
+                   comentarios_cierre = c->>'comentarios',
+                   evidencia_url = coalesce(c->>'evidencia_url', evidencia_url),
+                   fecha_cierre = coalesce((c->>'fecha_cierre')::timestamptz, now())
+             where id = (c->>'ot_id')::bigint;
+        end if;
+        return next c->>'clave';
+    end loop;
+end;
+$$;
+
+-- 2. Resúmenes -----------------------------------------------------------------
+-- Semana = lunes de la semana (date_trunc('week')). Las creadas cuentan en la semana
+-- de creación; las cerradas y sus horas de reparación, en la semana de cierre.
+-- Las concluidas sin fecha de cierre cuentan como cerradas en su semana de creación
+-- y sin horas; `reparaciones` son solo las cerradas con fecha (el divisor del MTTR).
+-- Son datos derivados: se recrean y se vuelven a calcular al final del script.
+drop table if exists public.analitica_semanal, public.analitica_tecnicos, public.analitica_activos;
+
+create table public.analitica_semanal (
+    semana            date    not null,
+    categoria         text    not null,
+    creadas           bigint  not null default 0,
+    cerradas          bigint  not null default 0,
+    reparaciones      bigint  not null default 0,
+    horas_reparacion  numeric not null default 0,
+    primary key (semana, categoria)
+);
+
+create table public.analitica_tecnicos (
+    semana      date   not null,
+    tecnico     text   not null,
+    asignadas   bigint not null default 0,
+    cerradas    bigint not null default 0,
+    primary key (semana, tecnico)
+);
+
+create table public.analitica_activos (
+    activo_id         bigint  primary key,
+    fallas            bigint  not null default 0,
+    cerradas          bigint  not null default 0,
+    reparaciones      bigint  not null default 0,
+    horas_reparacion  numeric not null default 0,
+    mttr_horas        numeric generated always as (horas_reparacion / nullif(reparaciones, 0)) stored,
+    ultima_falla      timestamptz
+);
+
+create index analitica_activos_fallas_idx on public.analitica_activos (fallas desc);
+create index analitica_activos_mttr_idx on public.analitica_activos (mttr_horas desc);
+
+-- Suma (signo = 1) o resta (signo = -1) el aporte de una orden a los resúmenes.
+-- La categoría es la del activo al momento del cambio.
+create or replace function public.aplicar_analitica(o public.ordenes, signo integer)
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_categoria text;
+    v_creada timestamptz := o.fecha_creacion::timestamptz;
+    v_cierre timestamptz;
+    v_horas numeric := 0;
+    v_cerrada integer := 0;
+    v_reparacion integer := 0;
+begin
+    select coalesce(a.categoria, '') into v_categoria from activos a where a.id = o.activo_id;
+    v_categoria := coalesce(v_categoria, '');
+    if o.estado = 'Concluida' then
+        v_cerrada := 1;
+        v_cierre := coalesce(o.fecha_cierre, v_creada);
+        if o.fecha_cierre is not null then
+            v_reparacion := 1;
+            v_horas := greatest(extract(epoch from (o.fecha_cierre - v_creada)) / 3600, 0);
+        end if;
+    end if;
+
+    insert into analitica_semanal (semana, categoria, creadas)
+    values (date_trunc('week', v_creada)::date, v_categoria, signo)
+    on conflict (semana, categoria) do update set creadas = analitica_semanal.creadas + signo;
+
+    insert into analitica_tecnicos (semana, tecnico, asignadas)
+    values (date_trunc('week', v_creada)::date, coalesce(o.tecnico_asignado, ''), signo)
+    on conflict (semana, tecnico) do update set asignadas = analitica_tecnicos.asignadas + signo;
+
+    if v_cerrada = 1 then
+        insert into analitica_semanal (semana, categoria, cerradas, reparaciones, horas_reparacion)
+        values (date_trunc('week', v_cierre)::date, v_categoria, signo, signo * v_reparacion, signo * v_horas)
+        on conflict (semana, categoria) do update
+            set cerradas = analitica_semanal.cerradas + signo,
+                reparaciones = analitica_semanal.reparaciones + signo * v_reparacion,
+                horas_reparacion = analitica_semanal.horas_reparacion + signo * v_horas;
+
+        insert into analitica_tecnicos (semana, tecnico, cerradas)
+        values (date_trunc('week', v_cierre)::date, coalesce(o.tecnico_asignado, ''), signo)
+        on conflict (semana, tecnico) do update set cerradas = analitica_tecnicos.cerradas + signo;
+    end if;
+
+    if o.activo_id is not null then
+        insert into analitica_activos (activo_id, fallas, cerradas, reparaciones, horas_reparacion, ultima_falla)
+        values (o.activo_id, signo, signo * v_cerrada, signo * v_reparacion, signo * v_horas, case when signo > 0 then v_creada end)
+        on conflict (activo_id) do update
+            set fallas = analitica_activos.fallas + signo,
+                cerradas = analitica_activos.cerradas + signo * v_cerrada,
+                reparaciones = analitica_activos.reparaciones + signo * v_reparacion,
+                horas_reparacion = analitica_activos.horas_reparacion + signo * v_horas,
+                ultima_falla = greatest(analitica_activos.ultima_falla, excluded.ultima_falla);
+    end if;
+end;
+$$;
+
+create or replace function public.actualizar_analitica()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform aplicar_analitica(old, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform aplicar_analitica(new, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists trg_analitica on public.ordenes;
+create trigger trg_analitica
+    after insert or delete or update of estado, fecha_creacion, fecha_cierre, activo_id, tecnico_asignado on public.ordenes
+    for each row execute function public.actualizar_analitica();
+
+-- 3. Carga inicial a partir de las órdenes existentes ----------------------------
+create temporary table analitica_carga as
+select o.activo_id,
+       coalesce(a.categoria, '') as categoria,
+       coalesce(o.tecnico_asignado, '') as tecnico,
+       o.fecha_creacion::timestamptz as creada,
+       o.estado = 'Concluida' as cerrada,
+       case when o.estado = 'Concluida' then coalesce(o.fecha_cierre, o.fecha_creacion::timestamptz) end as cierre,
+       o.estado = 'Concluida' and o.fecha_cierre is not null as reparada,
+       case when o.estado = 'Concluida' and o.fecha_cierre is not null
+            then greatest(extract(epoch from (o.fecha_cierre - o.fecha_creacion::timestamptz)) / 3600, 0)
+            else 0 end as horas
+  from public.ordenes o
+  left join public.activos a on a.id = o.activo_id;
+
+insert into public.analitica_semanal (semana, categoria, creadas, cerradas, reparaciones, horas_reparacion)
+select semana, categoria, sum(creadas), sum(cerradas), sum(reparaciones), sum(horas)
+  from (
+        select date_trunc('week', creada)::date as semana, categoria, 1 as creadas, 0 as cerradas,
+               0 as reparaciones, 0 as horas
+          from analitica_carga
+        union all
+        select date_trunc('week', cierre)::date, categoria, 0, 1, reparada::int, horas
+          from analitica_carga where cerrada
+       ) t
+ group by semana, categoria;
+
+insert into public.analitica_tecnicos (semana, tecnico, asignadas, cerradas)
+select semana, tecnico, sum(asignadas), sum(cerradas)
+  from (
+        select date_trunc('week', creada)::date as semana, tecnico, 1 as asignadas, 0 as cerradas from analitica_carga
+        union all
+        select date_trunc('week', cierre)::date, tecnico, 0, 1 from analitica_carga where cerrada
+       ) t
+ group by semana, tecnico;
+
+insert into public.analitica_activos (activo_id, fallas, cerradas, reparaciones, horas_reparacion, ultima_falla)
+select activo_id, count(*), count(*) filter (where cerrada), count(*) filter (where reparada),
+       sum(horas), max(creada)
+  from analitica_carga
+ where activo_id is not null
+ group by activo_id;
+
+drop table analitica_carga;
+
+grant select on public.analitica_semanal, public.analitica_tecnicos, public.analitica_activos to anon, authenticated;
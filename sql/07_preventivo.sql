@@ -0,0 +1,136 @@
+-- Mantenimiento preventivo: planes por activo o por categoría y OTs generadas por
+-- preventivo.py (tarea programada, fuera de la app). La clave única
+-- (plan_id, activo_id, programada_para) hace que repetir la tarea no duplique OTs.
+-- Requiere 06_analitica.sql (se redefine aplicar_analitica para no contar las
+-- preventivas como fallas del activo).
+
+create table if not exists public.planes_preventivos (
+    id             bigint generated by default as identity primary key,
+    nombre         text    not null,
+    descripcion    text    not null,
+    -- Alcance: un activo o todos los activos de una categoría
+    activo_id      bigint  references public.activos(id) on delete cascade,
+    categoria      text,
+    criticidad     text    not null default 'Media',
+    -- Vacía = según la categoría del activo (ver ESPECIALIDAD_POR_CATEGORIA en preventivo.py)
+    especialidad   text,
+    -- 'intervalo': cada `cada_dias` días. 'calendario': semanal (dia = 1 lunes .. 7 domingo),
+    -- mensual (dia del mes) o anual (dia y mes). El día va hasta 28 para que exista en todos los meses.
+    tipo           text    not null check (tipo in ('intervalo', 'calendario')),
+    cada_dias      integer check (cada_dias > 0),
+    frecuencia     text    check (frecuencia in ('semanal', 'mensual', 'anual')),
+    dia            integer check (dia between 1 and 28),
+    mes            integer check (mes between 1 and 12),
+    proxima_fecha  date    not null,
+    vigente        boolean not null default true,
+    creado_en      timestamptz not null default now(),
+    check ((activo_id is null) <> (categoria is null)),
+    check (tipo <> 'intervalo' or cada_dias is not null),
+    check (tipo <> 'calendario' or (frecuencia is not null and dia is not null
+                                    and (frecuencia <> 'semanal' or dia <= 7)
+                                    and (frecuencia <> 'anual' or mes is not null)))
+);
+
+create index if not exists planes_preventivos_vencidos_idx
+    on public.planes_preventivos (proxima_fecha) where vigente;
+
+-- OT generada por un plan: de qué plan y para qué fecha. Al borrar el plan sus OTs
+-- quedan sin plan_id, pero siguen marcadas como preventivas.
+alter table public.ordenes add column if not exists plan_id bigint
+    references public.planes_preventivos(id) on delete set null;
+alter table public.ordenes add column if not exists programada_para date;
+alter table public.ordenes add column if not exists preventiva boolean not null default false;
+
+-- Preventivas creadas antes de la columna (las de planes ya borrados conservan programada_para)
+update public.ordenes set preventiva = true
+ where not preventiva and (plan_id is not null or programada_para is not null);
+
+do $$
+begin
+    if not exists (select 1 from pg_constraint where conname = 'ordenes_plan_programada_key') then
+        -- Las correctivas tienen plan_id null y no chocan entre sí (null <> null)
+        alter table public.ordenes
+            add constraint ordenes_plan_programada_key unique (plan_id, activo_id, programada_para);
+    end if;
+end;
+$$;
+
+grant select, insert, update, delete on public.planes_preventivos to anon, authenticated;
+
+-- Las preventivas cuentan en el backlog, el MTTR y la carga, pero no como fallas del activo
+create or replace function public.aplicar_analitica(o public.ordenes, signo integer)
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_categoria text;
+    v_creada timestamptz := o.fecha_creacion::timestamptz;
+    v_cierre timestamptz;
+    v_horas numeric := 0;
+    v_cerrada integer := 0;
+    v_reparacion integer := 0;
+begin
+    select coalesce(a.categoria, '') into v_categoria from activos a where a.id = o.activo_id;
+    v_categoria := coalesce(v_categoria, '');
+    if o.estado = 'Concluida' then
+        v_cerrada := 1;
+        v_cierre := coalesce(o.fecha_cierre, v_creada);
+        if o.fecha_cierre is not null then
+            v_reparacion := 1;
+            v_horas := greatest(extract(epoch from (o.fecha_cierre - v_creada)) / 3600, 0);
+        end if;
+    end if;
+
+    insert into analitica_semanal (semana, categoria, creadas)
+    values (date_trunc('week', v_creada)::date, v_categoria, signo)
+    on conflict (semana, categoria) do update set creadas = analitica_semanal.creadas + signo;
+
+    insert into analitica_tecnicos (semana, tecnico, asignadas)
+    values (date_trunc('week', v_creada)::date, coalesce(o.tecnico_asignado, ''), signo)
+    on conflict (semana, tecnico) do update set asignadas = analitica_tecnicos.asignadas + signo;
+
+    if v_cerrada = 1 then
+        insert into analitica_semanal (semana, categoria, cerradas, reparaciones, horas_reparacion)
+        values (date_trunc('week', v_cierre)::date, v_categoria, signo, signo * v_reparacion, signo * v_horas)
+        on conflict (semana, categoria) do update
+            set cerradas = analitica_semanal.cerradas + signo,
+                reparaciones = analitica_semanal.reparaciones + signo * v_reparacion,
+                horas_reparacion = analitica_semanal.horas_reparacion + signo * v_horas;
+
+        insert into analitica_tecnicos (semana, tecnico, cerradas)
+        values (date_trunc('week', v_cierre)::date, coalesce(o.tecnico_asignado, ''), signo)
+        on conflict (semana, tecnico) do update set cerradas = analitica_tecnicos.cerradas + signo;
+    end if;
+
+    if o.activo_id is not null and not o.preventiva then
+        insert into analitica_activos (activo_id, fallas, cerradas, reparaciones, horas_reparacion, ultima_falla)
+        values (o.activo_id, signo, signo * v_cerrada, signo * v_reparacion, signo * v_horas, case when signo > 0 then v_creada end)
+        on conflict (activo_id) do update
+            set fallas = analitica_activos.fallas + signo,
+                cerradas = analitica_activos.cerradas + signo * v_cerrada,
+                reparaciones = analitica_activos.reparaciones + signo * v_reparacion,
+                horas_reparacion = analitica_activos.horas_reparacion + signo * v_horas,
+                ultima_falla = greatest(analitica_activos.ultima_falla, excluded.ultima_falla);
+    end if;
+end;
+$$;
+
+drop trigger if exists trg_analitica on public.ordenes;
+create trigger trg_analitica
+    after insert or delete or update of estado, fecha_creacion, fecha_cierre, activo_id, tecnico_asignado, preventiva on public.ordenes
+    for each row execute function public.actualizar_analitica();
+
+-- Resumen por activo sin las preventivas (el de 06_analitica.sql las incluía)
+truncate public.analitica_activos;
+
+insert into public.analitica_activos (activo_id, fallas, cerradas, reparaciones, horas_reparacion, ultima_falla)
+select activo_id, count(*), count(*) filter (where estado = 'Concluida'),
+       count(*) filter (where estado = 'Concluida' and fecha_cierre is not null),
+       coalesce(sum(greatest(extract(epoch from (fecha_cierre - fecha_creacion::timestamptz)) / 3600, 0))
+                    filter (where estado = 'Concluida'), 0),
+       max(fecha_creacion::timestamptz)
+  from public.ordenes
+ where activo_id is not null and not preventiva
+ group by activo_id;